@@ -0,0 +1,138 @@
+"""Foodgram API benchmarks.
+
+Run from backend directory, database is set by BENCH_DB_* variables
+(see benchmarks/settings.py), SQLite file by default:
+
+    python -m benchmarks seed --recipes 100000 --reset
+    python -m benchmarks run --output results.json
+    python -m benchmarks run --driver gunicorn --concurrency 8 \\
+        --baseline results.json
+
+'run' prints throughput, p50/p95/p99 latency and SQL queries per
+scenario, saves them as JSON and, with --baseline, exits with code 1
+if some scenario became slower than --max-regression or made more
+queries."""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed = commands.add_parser('seed', help='Fill database with dataset.')
+    seed.add_argument('--reset', action='store_true',
+                      help='Delete all data before seeding.')
+    seed.add_argument('--users', type=int, default=100)
+    seed.add_argument('--recipes', type=int, default=10000)
+    seed.add_argument('--ingredients-per-recipe', type=int, default=8)
+    seed.add_argument('--tags', type=int, default=20)
+    seed.add_argument('--favorites', type=int, default=50000)
+    seed.add_argument('--carts', type=int, default=20000)
+    seed.add_argument('--subscriptions', type=int, default=2000)
+    seed.add_argument('--ingredients-csv', default=None)
+    seed.add_argument('--random-seed', type=int, default=1)
+
+    run = commands.add_parser('run', help='Run scenarios.')
+    run.add_argument('--driver', choices=('client', 'gunicorn'),
+                     default='client')
+    run.add_argument('--workers', type=int, default=2,
+                     help='gunicorn workers.')
+    run.add_argument('--requests', type=int, default=200,
+                     help='Requests per scenario.')
+    run.add_argument('--concurrency', type=int, default=1)
+    run.add_argument('--warmup', type=int, default=5)
+    run.add_argument('--only', default='',
+                     help='Comma separated scenario names.')
+    run.add_argument('--output', default=None, help='JSON results file.')
+    run.add_argument('--baseline', default=None,
+                     help='JSON results of previous run to compare with.')
+    run.add_argument('--max-regression', type=float, default=0.2)
+    return parser.parse_args()
+
+
+def _seed(args):
+    from django.core.management import call_command
+    from benchmarks.seed import INGREDIENTS_CSV, seed
+
+    call_command('migrate', verbosity=0)
+    if args.reset:
+        call_command('flush', interactive=False, verbosity=0)
+
+    seed(users=args.users, recipes=args.recipes,
+         ingredients_per_recipe=args.ingredients_per_recipe, tags=args.tags,
+         favorites=args.favorites, carts=args.carts,
+         subscriptions=args.subscriptions,
+         ingredients_csv=args.ingredients_csv or INGREDIENTS_CSV,
+         random_seed=args.random_seed)
+    return 0
+
+
+def _run(args):
+    from benchmarks.runner import (ClientDriver, GunicornDriver, compare,
+                                   dataset_meta, run_scenario, save_results)
+    from benchmarks.scenarios import SCENARIOS, Context
+
+    names = [name for name in args.only.split(',') if name] or list(
+        SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        print(f'Unknown scenarios: {", ".join(sorted(unknown))}.')
+        return 2
+
+    context = Context()
+    driver = (GunicornDriver(workers=args.workers)
+              if args.driver == 'gunicorn' else ClientDriver())
+    results = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'driver': driver.name,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            **dataset_meta(),
+        },
+        'scenarios': {},
+    }
+
+    print(f'{"scenario":28} {"rps":>9} {"p50 ms":>9} {"p95 ms":>9} '
+          f'{"p99 ms":>9} {"queries":>7} {"errors":>6}')
+    try:
+        for name in names:
+            result = run_scenario(driver, context, SCENARIOS[name],
+                                  args.requests, args.concurrency,
+                                  args.warmup)
+            results['scenarios'][name] = result
+            print(f'{name:28} {result["throughput_rps"]:9.1f} '
+                  f'{result["p50_ms"]:9.2f} {result["p95_ms"]:9.2f} '
+                  f'{result["p99_ms"]:9.2f} '
+                  f'{str(result["queries_p50"]):>7} {result["errors"]:6}')
+    finally:
+        driver.close()
+
+    if args.output:
+        save_results(args.output, results)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        lines, regressions = compare(results, baseline, args.max_regression)
+        print('\n'.join(['', 'Compared with baseline:'] + lines))
+        if regressions:
+            print(f'Regressions: {", ".join(regressions)}.')
+            return 1
+    return 0
+
+
+def main():
+    args = _parse_args()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+    return _seed(args) if args.command == 'seed' else _run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
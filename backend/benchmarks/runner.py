@@ -0,0 +1,188 @@
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from django.db import connection, connections
+from django.test import Client
+
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def _queries(server_timing):
+    """SQL query count from Server-Timing of MetricsMiddleware."""
+    match = SERVER_TIMING_QUERIES.search(server_timing or '')
+    return int(match.group(1)) if match else None
+
+
+class ClientDriver:
+    """Requests through Django test client in current process."""
+    name = 'client'
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def request(self, method, path, token):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client()
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        start = time.perf_counter()
+        response = client.generic(method, path, **headers)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = time.perf_counter() - start
+        return (response.status_code, elapsed,
+                _queries(response.get('Server-Timing')))
+
+    def close(self):
+        connections.close_all()
+
+
+class GunicornDriver:
+    """Requests over HTTP to local gunicorn started with benchmark
+    settings."""
+    name = 'gunicorn'
+
+    def __init__(self, workers=2, threads=1, port=None):
+        self.port = port or self._free_port()
+        self.base_url = f'http://127.0.0.1:{self.port}'
+        self._local = threading.local()
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'benchmarks.settings'))
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'foodgram_backend.wsgi',
+             '--bind', f'127.0.0.1:{self.port}',
+             '--workers', str(workers), '--threads', str(threads),
+             '--log-level', 'warning'],
+            cwd=Path(__file__).resolve().parents[1], env=env,
+        )
+        self._wait()
+
+    @staticmethod
+    def _free_port():
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def _wait(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError('gunicorn exited.')
+            try:
+                requests.get(f'{self.base_url}/api/tags/', timeout=1)
+                return
+            except requests.RequestException:
+                time.sleep(0.2)
+        self.close()
+        raise RuntimeError('gunicorn did not start.')
+
+    def request(self, method, path, token):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        headers = {'Authorization': f'Token {token}'} if token else {}
+        start = time.perf_counter()
+        response = session.request(method, self.base_url + path,
+                                   headers=headers)
+        elapsed = time.perf_counter() - start
+        return (response.status_code, elapsed,
+                _queries(response.headers.get('Server-Timing')))
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def percentile(values, share):
+    """Nearest rank percentile of sorted values."""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1,
+                       int(round(share * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def run_scenario(driver, context, scenario, requests_count, concurrency=1,
+                 warmup=5):
+    for iteration in range(warmup):
+        driver.request(*scenario(context, iteration))
+
+    # Requests are built in advance, so random choices don't count.
+    planned = [scenario(context, warmup + iteration)
+               for iteration in range(requests_count)]
+    results = []
+    start = time.perf_counter()
+    if concurrency == 1:
+        results = [driver.request(*request) for request in planned]
+    else:
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(
+                lambda request: driver.request(*request), planned))
+    total = time.perf_counter() - start
+
+    latencies = sorted(elapsed for _, elapsed, _ in results)
+    queries = sorted(count for _, _, count in results if count is not None)
+    errors = sum(1 for status, _, _ in results if status >= 500)
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'statuses': sorted({status for status, _, _ in results}),
+        'throughput_rps': round(len(results) / total, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'queries_p50': percentile(queries, 0.50),
+        'queries_max': queries[-1] if queries else None,
+    }
+
+
+def dataset_meta():
+    from foodgram.models import (Favorite, Ingredient, IngredientToRecipe,
+                                 Recipe)
+    from users.models import User
+    return {
+        'database': connection.vendor,
+        'users': User.objects.count(),
+        'recipes': Recipe.objects.count(),
+        'ingredients': Ingredient.objects.count(),
+        'recipe_ingredients': IngredientToRecipe.objects.count(),
+        'favorites': Favorite.objects.count(),
+    }
+
+
+def save_results(path, results):
+    Path(path).write_text(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+def compare(results, baseline, max_regression):
+    """Lines comparing p95 latency and queries with baseline run and
+    list of scenarios where p95 grew more than max_regression share or
+    query count grew."""
+    lines = []
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            lines.append(f'{name:28} new')
+            continue
+        change = (current['p95_ms'] - previous['p95_ms']) / max(
+            previous['p95_ms'], 1e-9)
+        queries_grew = (current['queries_p50'] or 0) > (
+            previous['queries_p50'] or 0)
+        lines.append(
+            f'{name:28} p95 {previous["p95_ms"]:9.2f} -> '
+            f'{current["p95_ms"]:9.2f} ms ({change:+.0%}), queries '
+            f'{previous["queries_p50"]} -> {current["queries_p50"]}')
+        if change > max_regression or queries_grew:
+            regressions.append(name)
+    return lines, regressions
@@ -0,0 +1,98 @@
+import random
+
+from rest_framework.authtoken.models import Token
+from foodgram.models import Ingredient, Recipe, Tag
+from foodgram.pagination import RecipePagination
+
+PAGE_LIMIT = 6
+
+
+class Context:
+    """Ids and tokens of seeded dataset used to build requests."""
+    def __init__(self, random_seed=1, deep_page_share=0.9):
+        self.rng = random.Random(random_seed)
+        self.tokens = list(Token.objects.filter(
+            user__username__startswith='bench'
+        ).values_list('key', flat=True))
+        self.user_ids = list(Token.objects.filter(
+            key__in=self.tokens).values_list('user_id', flat=True))
+        self.recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        self.tag_slugs = list(Tag.objects.values_list('slug', flat=True))
+        self.ingredients = list(
+            Ingredient.objects.values_list('id', 'name'))
+        if not (self.tokens and self.recipe_ids and self.tag_slugs):
+            raise RuntimeError('Database is not seeded, run "seed" first.')
+
+        deep_offset = int(len(self.recipe_ids) * deep_page_share)
+        self.deep_page = deep_offset // PAGE_LIMIT + 1
+        # Last recipe of previous page, the first one for small datasets.
+        position = Recipe.objects.order_by('-pub_date', '-id')[
+            max(self.deep_page * PAGE_LIMIT - PAGE_LIMIT - 1, 0)]
+        self.deep_cursor = RecipePagination()._encode_cursor('n', position)
+
+    def token(self):
+        return self.rng.choice(self.tokens)
+
+    def recipe_id(self):
+        return self.rng.choice(self.recipe_ids)
+
+    def ingredient_prefix(self):
+        _, name = self.rng.choice(self.ingredients)
+        return name[:self.rng.randint(1, 3)]
+
+    def ingredient_ids(self, amount):
+        return [pk for pk, _ in self.rng.sample(self.ingredients, amount)]
+
+
+def _query(name, values):
+    return '&'.join(f'{name}={value}' for value in values)
+
+
+# Scenario: name -> function(context, iteration) returning
+# (method, path, token or None). Token is None for anonymous requests.
+SCENARIOS = {
+    'tags-list': lambda ctx, i: ('GET', '/api/tags/', None),
+    'ingredients-autocomplete': lambda ctx, i: (
+        'GET', f'/api/ingredients/?name={ctx.ingredient_prefix()}', None),
+    # Old SearchFilter path (benchmarks.urls), baseline for autocomplete.
+    'ingredients-icontains': lambda ctx, i: (
+        'GET', f'/api/_bench/ingredients-icontains/'
+        f'?name={ctx.ingredient_prefix()}', None),
+    'recipes-list-anonymous': lambda ctx, i: (
+        'GET', f'/api/recipes/?page=1&limit={PAGE_LIMIT}', None),
+    'recipes-list': lambda ctx, i: (
+        'GET', f'/api/recipes/?page=1&limit={PAGE_LIMIT}', ctx.token()),
+    'recipes-deep-offset': lambda ctx, i: (
+        'GET', f'/api/recipes/?page={ctx.deep_page}&limit={PAGE_LIMIT}',
+        ctx.token()),
+    'recipes-deep-keyset': lambda ctx, i: (
+        'GET', f'/api/recipes/?cursor={ctx.deep_cursor}&limit={PAGE_LIMIT}',
+        ctx.token()),
+    'recipes-tags': lambda ctx, i: (
+        'GET', '/api/recipes/?limit={}&{}'.format(
+            PAGE_LIMIT, _query('tags', ctx.rng.sample(
+                ctx.tag_slugs, min(3, len(ctx.tag_slugs))))),
+        ctx.token()),
+    'recipes-search': lambda ctx, i: (
+        'GET', f'/api/recipes/?search=суп&limit={PAGE_LIMIT}', ctx.token()),
+    'recipes-popular': lambda ctx, i: (
+        'GET', f'/api/recipes/?ordering=popular&limit={PAGE_LIMIT}',
+        ctx.token()),
+    'recipes-by-ingredients': lambda ctx, i: (
+        'GET', '/api/recipes/by_ingredients/?missing=3&limit={}&{}'.format(
+            PAGE_LIMIT, _query('ingredients', ctx.ingredient_ids(10))),
+        ctx.token()),
+    'recipe-detail': lambda ctx, i: (
+        'GET', f'/api/recipes/{ctx.recipe_id()}/', ctx.token()),
+    'subscriptions': lambda ctx, i: (
+        'GET', '/api/users/subscriptions/?recipes_limit=3', ctx.token()),
+    'download-shopping-cart': lambda ctx, i: (
+        'GET', '/api/recipes/download_shopping_cart/?format=txt',
+        ctx.token()),
+    # Same user and recipe on even and odd iterations: add, then remove.
+    'favorite-toggle': lambda ctx, i: (
+        'POST' if i % 2 == 0 else 'DELETE',
+        f'/api/recipes/{ctx.recipe_ids[i // 2 % len(ctx.recipe_ids)]}'
+        f'/favorite/',
+        ctx.tokens[i // 2 % len(ctx.tokens)]),
+}
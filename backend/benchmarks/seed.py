@@ -0,0 +1,143 @@
+import random
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from foodgram.catalog import catalog
+from foodgram.models import (Favorite, Ingredient, IngredientToRecipe,
+                             Recipe, ShoppingCart, Tag)
+from foodgram.search import update_search_vectors
+from foodgram.trending import update_trending_scores
+from users.models import Subscription, User
+
+INGREDIENTS_CSV = (
+    Path(__file__).resolve().parents[2] / 'data' / 'ingredients.csv')
+BATCH_SIZE = 5000
+PASSWORD = 'benchmark-password'
+
+WORDS = ('суп', 'салат', 'пирог', 'паста', 'рагу', 'омлет', 'каша',
+         'запеканка', 'соус', 'десерт', 'быстрый', 'домашний', 'острый',
+         'летний', 'овощной', 'куриный', 'рыбный', 'сырный', 'постный')
+
+
+def _batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bulk_create(model, rows, log, **kwargs):
+    created = 0
+    start = time.perf_counter()
+    for batch in _batches(rows):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, **kwargs)
+        created += len(batch)
+    log(f'{model._meta.label}: {created} rows '
+        f'in {time.perf_counter() - start:.1f}s.')
+
+
+def _pairs(rng, left, right, amount, exclude_same=False):
+    """Up to 'amount' unique random (left, right) pairs."""
+    seen = set()
+    attempts = 0
+    while len(seen) < amount and attempts < amount * 3:
+        attempts += 1
+        pair = (rng.choice(left), rng.choice(right))
+        if exclude_same and pair[0] == pair[1]:
+            continue
+        if pair not in seen:
+            seen.add(pair)
+            yield pair
+
+
+def seed(users=100, recipes=10000, ingredients_per_recipe=8, tags=20,
+         favorites=50000, carts=20000, subscriptions=2000,
+         ingredients_csv=INGREDIENTS_CSV, random_seed=1, log=print):
+    """Fill empty database with synthetic dataset using bulk_create.
+
+    Ingredients are loaded from shipped csv by 'load_ingredients',
+    benchmark users get auth tokens. Denormalized counters, search
+    vectors and trending scores are computed at the end."""
+    rng = random.Random(random_seed)
+
+    call_command('load_ingredients', str(ingredients_csv))
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+
+    _bulk_create(Tag, (
+        Tag(name=f'Тег {number}', slug=f'tag{number}',
+            color=f'#{rng.randrange(0x1000000):06x}')
+        for number in range(tags)), log)
+    tag_ids = list(Tag.objects.values_list('id', flat=True))
+
+    password = make_password(PASSWORD)
+    _bulk_create(User, (
+        User(username=f'bench{number}', email=f'bench{number}@example.com',
+             first_name='Bench', last_name=f'User{number}',
+             password=password)
+        for number in range(users)), log)
+    user_ids = list(User.objects.filter(
+        username__startswith='bench').values_list('id', flat=True))
+    _bulk_create(Token, (
+        Token(key=Token.generate_key(), user_id=user_id)
+        for user_id in user_ids), log)
+
+    now = timezone.now()
+    _bulk_create(Recipe, (
+        Recipe(
+            author_id=rng.choice(user_ids),
+            name=f'{rng.choice(WORDS)} {rng.choice(WORDS)} {number}',
+            text=' '.join(rng.choice(WORDS) for _ in range(30)),
+            cooking_time=rng.randint(5, 180),
+            image='recipes/images/benchmark.png',
+            # Recipes share publication seconds to exercise (pub_date, id)
+            # tie breaking.
+            pub_date=now - timedelta(seconds=number // 3),
+        )
+        for number in range(recipes)), log)
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+
+    _bulk_create(IngredientToRecipe, (
+        IngredientToRecipe(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                           amount=rng.randint(1, 500))
+        for recipe_id in recipe_ids
+        for ingredient_id in rng.sample(
+            ingredient_ids, min(ingredients_per_recipe, len(ingredient_ids)))
+    ), log)
+    _bulk_create(Recipe.tags.through, (
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in rng.sample(tag_ids, min(rng.randint(1, 3),
+                                              len(tag_ids)))
+    ), log)
+
+    _bulk_create(Favorite, (
+        Favorite(user_id=user_id, recipe_id=recipe_id)
+        for user_id, recipe_id in _pairs(
+            rng, user_ids, recipe_ids, favorites)), log)
+    _bulk_create(ShoppingCart, (
+        ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+        for user_id, recipe_id in _pairs(
+            rng, user_ids, recipe_ids, carts)), log)
+    _bulk_create(Subscription, (
+        Subscription(user_id=user_id, author_id=author_id)
+        for user_id, author_id in _pairs(
+            rng, user_ids, user_ids, subscriptions, exclude_same=True)), log)
+
+    call_command('recount')
+    call_command('rebuild_cart_totals')
+    update_search_vectors(Recipe.objects.values('id'))
+    update_trending_scores()
+    catalog.bump_version(Tag)
+    catalog.bump_version(Ingredient)
+    log('Seeding finished.')
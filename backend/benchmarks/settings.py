@@ -0,0 +1,25 @@
+"""Settings for benchmark runs: separate database and urls with
+baseline endpoints (benchmarks.urls), everything else as in production
+settings. Database is configured by BENCH_DB_* env variables,
+by default SQLite file next to this module."""
+import os
+from pathlib import Path
+
+from foodgram_backend.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': os.getenv('BENCH_DB_ENGINE',
+                            'django.db.backends.sqlite3'),
+        'NAME': os.getenv('BENCH_DB_NAME',
+                          str(Path(__file__).parent / 'bench.sqlite3')),
+        'USER': os.getenv('BENCH_DB_USER', ''),
+        'PASSWORD': os.getenv('BENCH_DB_PASSWORD', ''),
+        'HOST': os.getenv('BENCH_DB_HOST', ''),
+        'PORT': os.getenv('BENCH_DB_PORT', ''),
+    }
+}
+
+ALLOWED_HOSTS = ['localhost', '127.0.0.1', 'testserver']
+
+ROOT_URLCONF = 'benchmarks.urls'
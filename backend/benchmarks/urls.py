@@ -0,0 +1,18 @@
+"""Production urls and baseline endpoints served only in benchmark runs."""
+from django.urls import include, path
+from rest_framework import filters
+from foodgram.views import IngredientViewSet
+
+
+class IcontainsIngredientViewSet(IngredientViewSet):
+    """Ingredient search before IngredientSearchFilter: unbounded
+    'name' icontains of DRF SearchFilter, baseline for autocomplete."""
+    filter_backends = (filters.SearchFilter,)
+    search_fields = ('name',)
+
+
+urlpatterns = [
+    path('api/_bench/ingredients-icontains/',
+         IcontainsIngredientViewSet.as_view({'get': 'list'})),
+    path('', include('foodgram_backend.urls')),
+]
@@ -1,21 +1,56 @@
 from django.contrib import admin
 from foodgram.models import (Recipe, Ingredient, Tag,
                              IngredientToRecipe, Favorite, ShoppingCart)
+from foodgram.search import update_search_vectors
 
 
 class RecipeAdmin(admin.ModelAdmin):
     """Admin model for Recipe.
 
-    favorited - how many times recipe was added to favorite.
+    favorited - how many times recipe was added to favorite,
+        denormalized favorites_count counter.
     """
     search_fields = ('name', 'author__email', 'tags__slug')
-    readonly_fields = ('favorited',)
+    readonly_fields = ('favorited', 'favorites_count',
+                       'shopping_carts_count')
     list_filter = ('name', 'author', 'tags')
-    list_display = ('name', 'author')
+    list_display = ('name', 'author', 'favorited')
+    list_select_related = ('author',)
 
-    @admin.display()
+    @admin.display(ordering='favorites_count')
     def favorited(self, obj):
-        return obj.favorited.count()
+        return obj.favorites_count
+
+
+class ShoppingCartAdmin(admin.ModelAdmin):
+    """Admin model for ShoppingCart rows.
+
+    Changes made here don't update shopping_carts_count and cart totals,
+    run 'recount' and 'rebuild_cart_totals' commands after them.
+    """
+    search_fields = ('user__email', 'recipe__name')
+    list_display = ('user', 'recipe', 'added_at')
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
+
+
+class IngredientToRecipeAdmin(admin.ModelAdmin):
+    """Admin model for recipe ingredient rows.
+
+    Deleted rows are removed from search vectors of their recipes,
+    saved ones are handled by post_save signal."""
+    list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
+    raw_id_fields = ('recipe', 'ingredient')
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        update_search_vectors([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = list(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        update_search_vectors(recipe_ids)
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -28,6 +63,6 @@ class IngredientAdmin(admin.ModelAdmin):
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Tag)
-admin.site.register(IngredientToRecipe)
+admin.site.register(IngredientToRecipe, IngredientToRecipeAdmin)
 admin.site.register(Favorite)
-admin.site.register(ShoppingCart)
+admin.site.register(ShoppingCart, ShoppingCartAdmin)
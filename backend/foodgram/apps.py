@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class FoodgramConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'foodgram'
+
+    def ready(self):
+        import foodgram.checks  # noqa: F401
+        import foodgram.signals  # noqa: F401
+        from foodgram.views import RecipeViewSet
+        from foodgram_backend.metrics import register_counter
+
+        register_counter(
+            'foodgram_recipes_cache_hits_total',
+            'Anonymous recipe responses served from cache.',
+            lambda: RecipeViewSet.anonymous_cache.hits)
+        register_counter(
+            'foodgram_recipes_cache_misses_total',
+            'Anonymous recipe responses missed in cache.',
+            lambda: RecipeViewSet.anonymous_cache.misses)
@@ -0,0 +1,72 @@
+from django.db import transaction
+from rest_framework.response import Response
+from foodgram.counters import change_counters
+from foodgram.db import delete_returning, insert_many_or_ignore
+from foodgram.relations import invalidate_user_relations
+from foodgram.serializers import BatchIdsSerializer
+
+ADDED = 'added'
+ALREADY_ADDED = 'already_added'
+REMOVED = 'removed'
+NOT_ADDED = 'not_added'
+NOT_FOUND = 'not_found'
+FORBIDDEN = 'forbidden'
+
+
+def apply_batch(request, model, field, counter, on_change=None,
+                forbidden=()):
+    """Add (POST) or remove (DELETE) model rows of request user for
+    ids given as {'ids': [...]} and return status of every id.
+
+    field - foreign key of model to target (recipe, author),
+    counter - denormalized counter of target changed by 1 per row.
+    Ids are checked with one in_bulk, rows are changed with one
+    INSERT ... ON CONFLICT DO NOTHING or one DELETE and counters with one
+    UPDATE, all in one transaction.
+    on_change(changed_ids, sign) - is called in the same transaction.
+    forbidden - ids that can't be added (user himself for subscriptions).
+    """
+    serializer = BatchIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['ids']))
+
+    target = model._meta.get_field(field)
+    lookup = target.attname
+    user_id = request.user.id
+    adding = request.method == 'POST'
+
+    with transaction.atomic():
+        found = target.related_model.objects.only('pk').in_bulk(ids)
+        candidates = [pk for pk in ids
+                      if pk in found and not (adding and pk in forbidden)]
+
+        if adding:
+            changed = set(insert_many_or_ignore(
+                model, [{'user_id': user_id, lookup: pk}
+                        for pk in candidates], returning=lookup))
+        else:
+            changed = set(delete_returning(
+                model.objects.filter(
+                    user_id=user_id, **{f'{lookup}__in': candidates}),
+                returning=lookup)) if candidates else set()
+
+        if changed:
+            sign = 1 if adding else -1
+            change_counters(target.related_model, changed, counter, sign)
+            if on_change is not None:
+                on_change(changed, sign)
+            invalidate_user_relations(request)
+
+    results = []
+    for pk in ids:
+        if pk not in found:
+            result = NOT_FOUND
+        elif adding and pk in forbidden:
+            result = FORBIDDEN
+        elif adding:
+            result = ADDED if pk in changed else ALREADY_ADDED
+        else:
+            result = REMOVED if pk in changed else NOT_ADDED
+        results.append({'id': pk, 'status': result})
+
+    return Response({'results': results})
@@ -0,0 +1,130 @@
+import hashlib
+import threading
+from uuid import uuid4
+
+from django.core.cache import cache, caches
+from foodgram_backend.settings import (RECIPES_CACHE_ALIAS,
+                                       RECIPES_CACHE_TIMEOUT)
+
+SHOPPING_CART_VERSION_KEY = 'shopping_cart_version:{}'
+RECIPES_VERSION_KEY = 'recipes_version'
+RECIPES_SEARCH_VERSION_KEY = 'recipes_search_version'
+RECIPES_GENERATION_KEY = 'recipes_generation'
+USER_RELATIONS_VERSION_KEY = 'user_relations_version:{}'
+USER_RELATIONS_KEY = 'user_relations:{}:{}'
+SHOPPING_CART_FILE_KEY = 'shopping_cart_file:{}:{}:{}:{}'
+
+
+def _get_version(key):
+    """Versions are random tokens instead of counters, so evicted
+    version can't be reset to a value used by an old cached entry."""
+    return cache.get_or_set(key, uuid4().hex, None)
+
+
+def _bump_version(key):
+    cache.set(key, uuid4().hex, None)
+
+
+def bump_shopping_cart_version(user_id):
+    """Call when recipe added to or removed from user shopping cart."""
+    _bump_version(SHOPPING_CART_VERSION_KEY.format(user_id))
+
+
+def bump_recipes_version():
+    """Call when recipe ingredients changed, recipe deletes and
+    ingredient changes bump it through signals."""
+    _bump_version(RECIPES_VERSION_KEY)
+
+
+def bump_recipes_search_version():
+    """Call when recipe created or its name, text or ingredients changed."""
+    _bump_version(RECIPES_SEARCH_VERSION_KEY)
+
+
+def get_recipes_search_version():
+    return _get_version(RECIPES_SEARCH_VERSION_KEY)
+
+
+def bump_recipes_generation():
+    """Call when recipe created, updated or deleted."""
+    _bump_version(RECIPES_GENERATION_KEY)
+
+
+def bump_user_relations_version(user_id):
+    """Call when user favorite, shopping cart or subscriptions changed."""
+    _bump_version(USER_RELATIONS_VERSION_KEY.format(user_id))
+
+
+def get_user_relations_key(user_id):
+    return USER_RELATIONS_KEY.format(
+        user_id, _get_version(USER_RELATIONS_VERSION_KEY.format(user_id)))
+
+
+def get_shopping_cart_file_key(user_id, file_format):
+    return SHOPPING_CART_FILE_KEY.format(
+        user_id,
+        file_format,
+        _get_version(SHOPPING_CART_VERSION_KEY.format(user_id)),
+        _get_version(RECIPES_VERSION_KEY),
+    )
+
+
+def get_shopping_cart_file(key):
+    return cache.get(key)
+
+
+def cached_stream(key, chunks, timeout=None):
+    """Yield chunks and store joined file in cache after the last one."""
+    content = []
+    for chunk in chunks:
+        content.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(content), timeout)
+
+
+class AnonymousResponseCache:
+    """Cache of response data for anonymous requests in
+    RECIPES_CACHE_ALIAS cache.
+
+    Key is made of path, host, normalized query parameters (sorted,
+    without empty and ignored ones), recipes generation and 'versions'
+    given by caller, so entries are dropped by bump_recipes_generation().
+    hits and misses - counters of current process."""
+    key_prefix = 'anonymous_response'
+
+    def __init__(self, ignored_params=()):
+        self.ignored_params = frozenset(ignored_params)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def _cache(self):
+        return caches[RECIPES_CACHE_ALIAS]
+
+    def get_key(self, request, versions=()):
+        params = sorted(
+            (key, sorted({value for value in values if value}))
+            for key, values in request.query_params.lists()
+            if key not in self.ignored_params
+        )
+        params = [(key, values) for key, values in params if values]
+        raw_key = repr((request.get_host(), request.path, params,
+                        _get_version(RECIPES_GENERATION_KEY), versions))
+        return f'{self.key_prefix}:{hashlib.md5(raw_key.encode()).hexdigest()}'
+
+    def get(self, key):
+        data = self._cache.get(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def set(self, key, data):
+        self._cache.set(key, data, RECIPES_CACHE_TIMEOUT)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
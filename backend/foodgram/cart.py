@@ -0,0 +1,141 @@
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from foodgram.models import (IngredientToRecipe, ShoppingCart,
+                             ShoppingCartIngredient)
+
+
+def _upsert_totals(select_sql, params):
+    """Add (user_id, ingredient_id, total_amount, recipes_count) rows
+    of select_sql to ShoppingCartIngredient in one statement:
+    INSERT ... SELECT ... ON CONFLICT DO UPDATE (PostgreSQL, SQLite 3.24+).
+    select_sql should have WHERE clause, SQLite can't parse
+    ON CONFLICT after bare SELECT ... FROM."""
+    opts = ShoppingCartIngredient._meta
+    qn = connection.ops.quote_name
+    table = qn(opts.db_table)
+    user, ingredient, total_amount, recipes_count = (
+        qn(opts.get_field(name).column) for name in (
+            'user', 'ingredient', 'total_amount', 'recipes_count'))
+
+    sql = (
+        f'INSERT INTO {table} ({user}, {ingredient}, {total_amount}, '
+        f'{recipes_count}) {select_sql} '
+        f'ON CONFLICT ({user}, {ingredient}) DO UPDATE SET '
+        f'{total_amount} = {table}.{total_amount} '
+        f'+ EXCLUDED.{total_amount}, '
+        f'{recipes_count} = {table}.{recipes_count} '
+        f'+ EXCLUDED.{recipes_count}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def change_cart_totals(user_id, recipe_ids, sign):
+    """Add (sign=1) or subtract (sign=-1) ingredients of recipes
+    to totals of user shopping cart."""
+    if not recipe_ids:
+        return
+
+    opts = IngredientToRecipe._meta
+    qn = connection.ops.quote_name
+    ingredient, amount, recipe = (
+        qn(opts.get_field(name).column)
+        for name in ('ingredient', 'amount', 'recipe'))
+
+    _upsert_totals(
+        f'SELECT %s, {ingredient}, %s * SUM({amount}), %s * COUNT(*) '
+        f'FROM {qn(opts.db_table)} '
+        f'WHERE {recipe} IN ({", ".join(["%s"] * len(recipe_ids))}) '
+        f'GROUP BY {ingredient} ORDER BY {ingredient}',
+        [user_id, sign, sign, *recipe_ids],
+    )
+    if sign < 0:
+        ShoppingCartIngredient.objects.filter(
+            user_id=user_id, recipes_count__lte=0).delete()
+
+
+def change_recipe_in_carts(recipe_id, changes):
+    """Apply ingredient changes of recipe to totals of every shopping
+    cart with this recipe in one statement.
+
+    changes - {ingredient_id: (amount delta, recipes_count delta)},
+    recipes_count delta is 1 for added ingredient, -1 for removed one
+    and 0 if only amount changed. Changes are joined as VALUES list,
+    its columns are named column1..3 both in PostgreSQL and SQLite."""
+    if not changes:
+        return
+
+    cart = ShoppingCart._meta
+    qn = connection.ops.quote_name
+    values = ', '.join(['(%s, %s, %s)'] * len(changes))
+    params = []
+    for ingredient_id, (amount, recipes) in sorted(changes.items()):
+        params.extend((ingredient_id, amount, recipes))
+
+    _upsert_totals(
+        f'SELECT c.{qn(cart.get_field("user").column)}, '
+        f'v.column1, v.column2, v.column3 '
+        f'FROM {qn(cart.db_table)} c '
+        f'CROSS JOIN (VALUES {values}) v '
+        f'WHERE c.{qn(cart.get_field("recipe").column)} = %s',
+        params + [recipe_id],
+    )
+    removed = [ingredient_id for ingredient_id, (_, recipes)
+               in changes.items() if recipes < 0]
+    if removed:
+        ShoppingCartIngredient.objects.filter(
+            ingredient_id__in=removed, recipes_count__lte=0).delete()
+
+
+def remove_recipe_from_carts(recipe_id):
+    """Subtract all ingredients of recipe from shopping carts with it,
+    call before recipe is deleted."""
+    change_recipe_in_carts(recipe_id, {
+        ingredient_id: (-amount, -1)
+        for ingredient_id, amount in IngredientToRecipe.objects.filter(
+            recipe_id=recipe_id).values_list('ingredient_id', 'amount')
+    })
+
+
+def get_cart_totals(user_ids):
+    """Real totals of shopping carts of users aggregated from recipes:
+    {(user_id, ingredient_id): (total_amount, recipes_count)}."""
+    rows = (
+        IngredientToRecipe.objects
+        .filter(recipe__shopping_carts__user__in=user_ids)
+        .values_list('recipe__shopping_carts__user', 'ingredient')
+        .annotate(total_amount=Sum('amount'), recipes_count=Count('id'))
+        .order_by()
+    )
+    return {(user_id, ingredient_id): (total_amount, recipes_count)
+            for user_id, ingredient_id, total_amount, recipes_count in rows}
+
+
+def get_stored_cart_totals(user_ids):
+    return {
+        (user_id, ingredient_id): (total_amount, recipes_count)
+        for user_id, ingredient_id, total_amount, recipes_count in
+        ShoppingCartIngredient.objects.filter(user__in=user_ids)
+        .values_list('user', 'ingredient', 'total_amount', 'recipes_count')
+    }
+
+
+@transaction.atomic
+def rebuild_cart_totals(user_ids):
+    """Rewrite totals of users from their shopping carts.
+    Returns ids of users whose totals were wrong."""
+    user_ids = list(user_ids)
+    expected = get_cart_totals(user_ids)
+    stored = get_stored_cart_totals(user_ids)
+    wrong = {key[0] for key, _ in expected.items() ^ stored.items()}
+
+    if wrong:
+        ShoppingCartIngredient.objects.filter(user__in=wrong).delete()
+        ShoppingCartIngredient.objects.bulk_create(
+            ShoppingCartIngredient(
+                user_id=user_id, ingredient_id=ingredient_id,
+                total_amount=total_amount, recipes_count=recipes_count)
+            for (user_id, ingredient_id), (total_amount, recipes_count)
+            in expected.items() if user_id in wrong
+        )
+    return wrong
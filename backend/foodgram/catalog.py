@@ -0,0 +1,116 @@
+import threading
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from django.core.cache import caches
+from foodgram_backend.settings import (CATALOG_CACHE_ALIAS,
+                                       CATALOG_CACHE_TIMEOUT,
+                                       CATALOG_VERSION_CHECK_INTERVAL)
+
+
+class _Entry:
+    """Loaded table of one model with version it was loaded for."""
+    def __init__(self, version, objects):
+        self.version = version
+        self.objects = objects
+        self.checked_at = time.monotonic()
+
+
+class Catalog:
+    """Process memory cache for reference tables (Tag, Ingredient).
+
+    Whole table of model is loaded at once and kept in process memory.
+    Each model has version token in shared Django cache
+    (CATALOG_CACHE_ALIAS), memory is checked against it not more often
+    than once per CATALOG_VERSION_CHECK_INTERVAL seconds, so changes made
+    in one gunicorn worker reach others with bounded delay. Loaded tables
+    are also kept in shared cache, so new workers don't hit database.
+    bump_version() - called from post_save/post_delete signals.
+    Version token starts with its creation time, see last_modified()."""
+    version_key = 'catalog_version:{}'
+    data_key = 'catalog_data:{}:{}'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    @property
+    def _cache(self):
+        return caches[CATALOG_CACHE_ALIAS]
+
+    def _new_version(self):
+        return f'{time.time():.6f}:{uuid4().hex}'
+
+    def _get_shared_version(self, model):
+        return self._cache.get_or_set(
+            self.version_key.format(model._meta.label_lower),
+            self._new_version(), None)
+
+    def bump_version(self, model):
+        label = model._meta.label_lower
+        self._cache.set(self.version_key.format(label),
+                        self._new_version(), None)
+        with self._lock:
+            self._entries.pop(label, None)
+
+    def _load(self, model, version):
+        key = self.data_key.format(model._meta.label_lower, version)
+        objects = self._cache.get(key)
+
+        if objects is None:
+            objects = list(model.objects.all())
+            self._cache.set(key, objects, CATALOG_CACHE_TIMEOUT)
+
+        return {obj.pk: obj for obj in objects}
+
+    def _get_entry(self, model):
+        label = model._meta.label_lower
+
+        with self._lock:
+            entry = self._entries.get(label)
+        if entry is not None and (time.monotonic() - entry.checked_at
+                                  < CATALOG_VERSION_CHECK_INTERVAL):
+            return entry
+
+        version = self._get_shared_version(model)
+        if entry is not None and entry.version == version:
+            entry.checked_at = time.monotonic()
+            return entry
+
+        entry = _Entry(version, self._load(model, version))
+        with self._lock:
+            self._entries[label] = entry
+        return entry
+
+    def version(self, model):
+        """Version of objects currently served for model."""
+        return self._get_entry(model).version
+
+    def last_modified(self, model):
+        """Time of version currently served for model, may be later than
+        real change if version was evicted from shared cache."""
+        try:
+            timestamp = float(self.version(model).split(':')[0])
+        except ValueError:
+            return None
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+    def all(self, model):
+        """List of all objects in model default ordering."""
+        return list(self._get_entry(model).objects.values())
+
+    def get(self, model, pk):
+        """Object by primary key or None."""
+        try:
+            return self._get_entry(model).objects.get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def in_bulk(self, model, pks):
+        """Dict of found objects by primary key like QuerySet.in_bulk()."""
+        objects = self._get_entry(model).objects
+        return {pk: objects[pk] for pk in pks if pk in objects}
+
+
+catalog = Catalog()
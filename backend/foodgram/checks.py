@@ -0,0 +1,25 @@
+from django.core.checks import Error, Tags, register
+from foodgram_backend.settings import (CACHES, CATALOG_CACHE_ALIAS,
+                                       RECIPES_CACHE_ALIAS)
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    """Versions of catalog, user relations, shopping cart files and
+    anonymous recipe responses are bumped by one worker and read by all
+    of them, so their caches can't be local to process."""
+    errors = []
+    for alias in sorted({'default', CATALOG_CACHE_ALIAS,
+                         RECIPES_CACHE_ALIAS}):
+        backend = CACHES[alias]['BACKEND']
+        if backend in PROCESS_LOCAL_CACHES:
+            errors.append(Error(
+                f"Cache '{alias}' is local to process ({backend}), "
+                'changes made by one worker stay unseen by others.',
+                hint='Set CACHE_BACKEND and CACHE_LOCATION to shared '
+                     'cache, e.g. Redis of docker-compose.yml.',
+                id='foodgram.E001',
+            ))
+    return errors
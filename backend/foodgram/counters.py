@@ -0,0 +1,36 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def change_counter(model, pk, field, delta):
+    """Atomically change denormalized counter by delta in one UPDATE,
+    never below zero."""
+    if delta:
+        model.objects.filter(pk=pk).update(
+            **{field: Greatest(F(field) + delta, 0)})
+
+
+def change_counters(model, pks, field, delta):
+    """change_counter() of several rows with the same delta."""
+    if delta and pks:
+        model.objects.filter(pk__in=pks).update(
+            **{field: Greatest(F(field) + delta, 0)})
+
+
+def count_subquery(related_model, related_field):
+    """Amount of related_model rows pointing to outer row."""
+    return Coalesce(Subquery(
+        related_model.objects
+        .filter(**{related_field: OuterRef('pk')})
+        .order_by()
+        .values(related_field)
+        .annotate(count=Count('*'))
+        .values('count')
+    ), 0)
+
+
+def recount(queryset, field, related_model, related_field):
+    """Rewrite counter of rows in queryset from real amount of related
+    rows with one UPDATE. Returns amount of updated rows."""
+    return queryset.update(
+        **{field: count_subquery(related_model, related_field)})
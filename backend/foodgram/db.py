@@ -0,0 +1,64 @@
+from django.db import connection
+
+
+def insert_many_or_ignore(model, rows, returning='pk'):
+    """Insert rows in one statement, skip those that break unique
+    constraint: INSERT ... ON CONFLICT DO NOTHING RETURNING
+    (PostgreSQL, SQLite 3.35+). Returns list of 'returning' field
+    values of inserted rows.
+
+    rows - dicts with the same keys: field names or attnames ('user_id')
+    and values, other fields get defaults like in Model.save()."""
+    if not rows:
+        return []
+
+    opts = model._meta
+    fields = [field for field in opts.concrete_fields
+              if not field.primary_key or field.attname in rows[0]]
+    returning = opts.pk if returning == 'pk' else opts.get_field(returning)
+    qn = connection.ops.quote_name
+    placeholders = '({})'.format(', '.join(['%s'] * len(fields)))
+
+    sql = 'INSERT INTO {} ({}) VALUES {} ON CONFLICT DO NOTHING ' \
+        'RETURNING {}'.format(
+            qn(opts.db_table),
+            ', '.join(qn(field.column) for field in fields),
+            ', '.join([placeholders] * len(rows)),
+            qn(returning.column),
+        )
+    params = []
+    for values in rows:
+        obj = model(**values)
+        params.extend(
+            field.get_db_prep_save(field.pre_save(obj, True), connection)
+            for field in fields)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def insert_or_ignore(model, **values):
+    """insert_many_or_ignore() of one row.
+    Returns True if row was inserted."""
+    return bool(insert_many_or_ignore(model, [values]))
+
+
+def delete_returning(queryset, returning='pk'):
+    """Delete rows of queryset in one statement: DELETE ... RETURNING
+    (PostgreSQL, SQLite 3.35+). Returns list of 'returning' field values
+    of deleted rows, concurrent deletes can't return the same row twice.
+
+    Signals and cascades are skipped, use for rows nothing points to."""
+    opts = queryset.model._meta
+    returning = opts.pk if returning == 'pk' else opts.get_field(returning)
+    qn = connection.ops.quote_name
+    subquery, params = queryset.values('pk').order_by().query.sql_with_params()
+
+    sql = 'DELETE FROM {} WHERE {} IN ({}) RETURNING {}'.format(
+        qn(opts.db_table), qn(opts.pk.column), subquery,
+        qn(returning.column))
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
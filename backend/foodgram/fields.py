@@ -0,0 +1,115 @@
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from foodgram.catalog import catalog
+from foodgram.images import ImageDecodeError, decode_base64_image
+
+
+def resolve_in_bulk(queryset, pks):
+    """Resolve primary keys to objects of queryset model.
+
+    Objects are taken from catalog cache, pks missing there (e.g. just
+    created in other worker) are looked up with one in_bulk() query.
+    Returns dict of found objects and sorted list of unknown pks."""
+    pks = set(pks)
+    objects = catalog.in_bulk(queryset.model, pks)
+    missing = pks - objects.keys()
+
+    if missing:
+        objects.update(queryset.in_bulk(missing))
+        missing = missing - objects.keys()
+
+    return objects, sorted(missing)
+
+
+def format_pks(pks):
+    return ', '.join(f'"{pk}"' for pk in pks)
+
+
+class BulkPrimaryKeyListField(serializers.ListField):
+    """List of primary keys resolved to objects with one bulk lookup.
+    All unknown pks are reported in single error."""
+    child = serializers.IntegerField()
+    default_error_messages = {
+        'does_not_exist': 'Invalid pk {pk_values} - objects do not exist.',
+    }
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        pks = super().to_internal_value(data)
+        objects, missing = resolve_in_bulk(self.queryset, pks)
+
+        if missing:
+            self.fail('does_not_exist', pk_values=format_pks(missing))
+
+        return [objects[pk] for pk in pks]
+
+
+class BulkRelatedListSerializer(serializers.ListSerializer):
+    """ListSerializer which resolves 'id' field of all items
+    with one bulk lookup over child Meta.related_queryset.
+    All unknown ids are reported in single error."""
+    default_error_messages = {
+        'does_not_exist': BulkPrimaryKeyListField.default_error_messages[
+            'does_not_exist'],
+    }
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        objects, missing = resolve_in_bulk(
+            self.child.Meta.related_queryset,
+            [item['id'] for item in items])
+
+        if missing:
+            raise serializers.ValidationError({'id': [
+                self.error_messages['does_not_exist'].format(
+                    pk_values=format_pks(missing))
+            ]})
+
+        for item in items:
+            item['id'] = objects[item['id']]
+
+        return items
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    """Image sent as 'data:image/<ext>;base64,<data>' string.
+
+    Decoded by chunks into spooled temporary file, only format and
+    dimensions are checked from image header.
+    Urls (already stored image) are skipped."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('http'):
+            raise SkipField()
+        if not isinstance(data, str) or not data.startswith('data:'):
+            self.fail('invalid_image')
+
+        try:
+            return decode_base64_image(data)
+        except ImageDecodeError as error:
+            raise serializers.ValidationError(str(error))
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Represents Recipe.image_variants names as absolute urls:
+    {'<width>': {'webp': url, 'jpeg': url}}.
+    Empty until background thumbnails are ready."""
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+
+        def build_url(name):
+            url = default_storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+
+        return {
+            width: {
+                extension: build_url(name)
+                for extension, name in variant.items()
+            }
+            for width, variant in (value or {}).items()
+        }
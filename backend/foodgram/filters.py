@@ -1,14 +1,36 @@
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Lower
 from django_filters import rest_framework as filters
-from foodgram.models import Recipe
+from django_filters.widgets import QueryArrayWidget
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+from foodgram.catalog import catalog
+from foodgram.models import Recipe, Tag
+from foodgram.search import ingredient_prefix_index, search_recipes
+from foodgram_backend.settings import INGREDIENTS_SEARCH_LIMIT
 
 
 class RecipeFilter(filters.FilterSet):
-    """Filter for recipe model."""
+    """Filter for recipe model.
+
+    tags - one or more slugs ('?tags=a&tags=b'), recipes with any of them.
+    search - full text search over name, ingredient names and text,
+        results are ordered by rank unless ordering is given.
+    ordering - 'popular' (by favorites_count) or 'trending'
+        (by precomputed trending_score), both index-backed,
+        default is Recipe.Meta.ordering."""
+    ORDERINGS = {
+        'popular': ('-favorites_count', '-id'),
+        'trending': ('-trending_score', '-id'),
+    }
+
     author = filters.CharFilter(
         field_name='author',
     )
-    tags = filters.CharFilter(
-        field_name='tags__slug',
+    tags = filters.Filter(
+        method='tags_filter',
+        widget=QueryArrayWidget,
     )
     is_favorited = filters.BooleanFilter(
         method='is_favorited_filter',
@@ -16,6 +38,13 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_filter'
     )
+    search = filters.CharFilter(
+        method='search_filter',
+    )
+    ordering = filters.ChoiceFilter(
+        choices=[(key, key) for key in ORDERINGS],
+        method='ordering_filter',
+    )
 
     class Meta:
         model = Recipe
@@ -30,6 +59,27 @@ class RecipeFilter(filters.FilterSet):
 
         return queryset
 
+    def tags_filter(self, queryset, name, value):
+        slugs = set(value)
+        tag_ids = [tag.id for tag in catalog.all(Tag) if tag.slug in slugs]
+
+        if not tag_ids:
+            return queryset.none()
+
+        # EXISTS instead of JOIN, so recipe with several matched tags
+        # is returned once without DISTINCT.
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id__in=tag_ids)
+        ))
+
+    def search_filter(self, queryset, name, value):
+        value = value.strip()
+        return search_recipes(queryset, value) if value else queryset
+
+    def ordering_filter(self, queryset, name, value):
+        return queryset.order_by(*self.ORDERINGS[value])
+
     def is_in_shopping_cart_filter(self, queryset, name, value):
         user = self.request.user
 
@@ -39,3 +89,56 @@ class RecipeFilter(filters.FilterSet):
                 queryset.exclude(shopping_carts__user=user))
 
         return queryset
+
+
+class IngredientSearchFilter(BaseFilterBackend):
+    """Autocomplete for ingredient list through 'name' query parameter.
+
+    Prefix matches go first, then substring matches, case-insensitive.
+    Result is limited by 'limit' query parameter, capped
+    by INGREDIENTS_SEARCH_LIMIT.
+    On PostgreSQL lookups are served by lower(name) prefix and trigram
+    indexes, on other databases by in-process IngredientPrefixIndex."""
+    search_param = api_settings.SEARCH_PARAM
+    limit_param = 'limit'
+
+    def _get_limit(self, request):
+        try:
+            limit = int(request.query_params.get(self.limit_param))
+        except (TypeError, ValueError):
+            return INGREDIENTS_SEARCH_LIMIT
+
+        if limit <= 0:
+            return INGREDIENTS_SEARCH_LIMIT
+
+        return min(limit, INGREDIENTS_SEARCH_LIMIT)
+
+    def _search_database(self, queryset, search, limit):
+        queryset = queryset.annotate(lower_name=Lower('name'))
+        result = list(
+            queryset.filter(lower_name__startswith=search)
+            .order_by('lower_name', 'id')[:limit]
+        )
+
+        if len(result) < limit:
+            result += list(
+                queryset.filter(lower_name__contains=search)
+                .filter(~Q(lower_name__startswith=search))
+                .order_by('lower_name', 'id')[:limit - len(result)]
+            )
+
+        return result
+
+    def filter_queryset(self, request, queryset, view):
+        search = request.query_params.get(self.search_param, '')
+        search = search.strip().lower()
+
+        if not search or view.action != 'list':
+            return queryset
+
+        limit = self._get_limit(request)
+
+        if connection.vendor == 'postgresql':
+            return self._search_database(queryset, search, limit)
+
+        return ingredient_prefix_index.search(search, limit)
@@ -0,0 +1,135 @@
+import base64
+import binascii
+import io
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+from tempfile import SpooledTemporaryFile
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+from foodgram.cache import bump_recipes_generation
+from foodgram.models import Recipe
+from foodgram_backend.settings import (RECIPE_IMAGE_FORMATS,
+                                       RECIPE_IMAGE_MAX_SIDE,
+                                       RECIPE_IMAGE_SPOOL_SIZE,
+                                       RECIPE_IMAGE_WIDTHS,
+                                       RECIPE_IMAGE_WORKERS)
+
+logger = logging.getLogger(__name__)
+
+# Multiple of 4, so every chunk of base64 string decodes independently.
+BASE64_CHUNK_SIZE = 64 * 1024
+
+THUMBNAILS_DIR = 'recipes/thumbnails/'
+
+_executor = ThreadPoolExecutor(max_workers=RECIPE_IMAGE_WORKERS,
+                               thread_name_prefix='recipe-thumbnails')
+
+
+class ImageDecodeError(ValueError):
+    pass
+
+
+def decode_base64_image(data):
+    """Decode 'data:image/<ext>;base64,<data>' string chunk by chunk
+    into spooled temporary file (kept in memory up to
+    RECIPE_IMAGE_SPOOL_SIZE bytes).
+
+    Only image header is parsed to check format and dimensions,
+    pixel data is not decoded. Returns django File."""
+    try:
+        _, encoded = data.split(';base64,', 1)
+    except ValueError:
+        raise ImageDecodeError('Invalid base64 image.')
+    # Line breaks and spaces would shift chunks off 4 character groups.
+    encoded = ''.join(encoded.split())
+
+    temp_file = SpooledTemporaryFile(max_size=RECIPE_IMAGE_SPOOL_SIZE)
+    try:
+        for start in range(0, len(encoded), BASE64_CHUNK_SIZE):
+            temp_file.write(base64.b64decode(
+                encoded[start:start + BASE64_CHUNK_SIZE], validate=True))
+    except binascii.Error:
+        temp_file.close()
+        raise ImageDecodeError('Invalid base64 image.')
+    temp_file.seek(0)
+
+    try:
+        with Image.open(temp_file) as image:
+            image_format = image.format
+            width, height = image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        temp_file.close()
+        raise ImageDecodeError('Upload a valid image.')
+
+    if image_format not in RECIPE_IMAGE_FORMATS:
+        temp_file.close()
+        raise ImageDecodeError(f'Image format {image_format} not allowed.')
+    if max(width, height) > RECIPE_IMAGE_MAX_SIDE:
+        temp_file.close()
+        raise ImageDecodeError(
+            f'Image sides should be not greater than '
+            f'{RECIPE_IMAGE_MAX_SIDE}px.')
+
+    temp_file.seek(0)
+    extension = image_format.lower().replace('jpeg', 'jpg')
+    return File(temp_file, name=f'{uuid.uuid4()}.{extension}')
+
+
+def _thumbnail_name(image_name, width, extension):
+    stem = PurePosixPath(image_name).stem
+    return f'{THUMBNAILS_DIR}{stem}_{width}.{extension}'
+
+
+def _save_variant(image, name, image_format):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=80)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def make_thumbnails(recipe_id, image_name):
+    """Save WebP and JPEG copies of recipe image for every width in
+    RECIPE_IMAGE_WIDTHS smaller than original and store their names
+    in Recipe.image_variants, if recipe image wasn't changed meanwhile."""
+    try:
+        with default_storage.open(image_name) as file, \
+                Image.open(file) as image:
+            # JPEG can be decoded at reduced scale right away.
+            image.draft('RGB', (max(RECIPE_IMAGE_WIDTHS),) * 2)
+            image = ImageOps.exif_transpose(image).convert('RGB')
+
+            variants = {}
+            for width in RECIPE_IMAGE_WIDTHS:
+                if width >= image.width:
+                    continue
+                thumbnail = image.copy()
+                thumbnail.thumbnail((width, image.height))
+                variants[str(width)] = {
+                    'webp': _save_variant(
+                        thumbnail,
+                        _thumbnail_name(image_name, width, 'webp'), 'WEBP'),
+                    'jpeg': _save_variant(
+                        thumbnail,
+                        _thumbnail_name(image_name, width, 'jpg'), 'JPEG'),
+                }
+
+        if Recipe.objects.filter(id=recipe_id, image=image_name).update(
+                image_variants=variants, updated_at=timezone.now()):
+            bump_recipes_generation()
+    except Exception:
+        logger.exception('Thumbnails for recipe %s failed.', recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_thumbnails(recipe):
+    """Make thumbnails in background thread after transaction commit."""
+    recipe_id, image_name = recipe.id, recipe.image.name
+    transaction.on_commit(
+        lambda: _executor.submit(make_thumbnails, recipe_id, image_name))
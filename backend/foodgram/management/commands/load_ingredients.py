@@ -0,0 +1,220 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from foodgram.catalog import catalog
+from foodgram.models import Ingredient
+
+READ_SIZE = 64 * 1024
+# Positions of invalid rows shown in summary.
+SHOWN_INVALID = 10
+
+
+def iter_csv(file):
+    """(line number, name, measurement_unit) of rows
+    'name,measurement_unit' without header. Rows with other amount
+    of values give None values, so they are counted as invalid,
+    empty lines are skipped."""
+    reader = csv.reader(file)
+    for row in reader:
+        if not row:
+            continue
+        if len(row) != 2:
+            row = (None, None)
+        yield (reader.line_num, *row)
+
+
+def iter_json(file):
+    """(item number, name, measurement_unit) of objects of top level
+    json array, decoded one by one, so memory doesn't depend on file
+    size."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    number = 0
+
+    while True:
+        chunk = file.read(READ_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('Json file should contain array.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError('Invalid json file.')
+                break
+            number += 1
+            if not isinstance(item, dict):
+                item = {}
+            yield number, item.get('name'), item.get('measurement_unit')
+
+        if not chunk:
+            return
+
+
+class RowsFile:
+    """Read-only file-like object producing csv from rows iterator
+    for COPY ... FROM STDIN.
+    error - exception raised by rows iterator, psycopg2 replaces it
+        by query error."""
+    def __init__(self, rows):
+        self._rows = rows
+        self._parts = []
+        self._length = 0
+        self._writer = csv.writer(self)
+        self.error = None
+
+    def write(self, value):
+        self._parts.append(value)
+        self._length += len(value)
+
+    def read(self, size=-1):
+        while size < 0 or self._length < size:
+            try:
+                row = next(self._rows, None)
+            except Exception as error:
+                self.error = error
+                raise
+            if row is None:
+                break
+            self._writer.writerow(row)
+        buffer = ''.join(self._parts)
+        if size < 0:
+            size = len(buffer)
+        data, rest = buffer[:size], buffer[size:]
+        self._parts = [rest] if rest else []
+        self._length = len(rest)
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+class Command(BaseCommand):
+    help = ('Load ingredients from csv (name,measurement_unit rows) '
+            'or json (array of objects) file. Existing ingredients '
+            'are skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path)
+        parser.add_argument('--format', choices=('csv', 'json'),
+                            help='File format, by default from extension.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per bulk_create on non PostgreSQL.')
+
+    def _clean_rows(self, rows):
+        """Strip values and skip rows not fitting Ingredient fields,
+        positions of the first SHOWN_INVALID of them are kept."""
+        max_name = Ingredient._meta.get_field('name').max_length
+        max_unit = Ingredient._meta.get_field('measurement_unit').max_length
+        for position, name, measurement_unit in rows:
+            self.processed += 1
+            name = name.strip() if isinstance(name, str) else ''
+            measurement_unit = measurement_unit.strip() if isinstance(
+                measurement_unit, str) else ''
+            if (not name or not measurement_unit or len(name) > max_name
+                    or len(measurement_unit) > max_unit):
+                self.skipped += 1
+                if len(self.invalid) < SHOWN_INVALID:
+                    self.invalid.append(position)
+                continue
+            yield name, measurement_unit
+
+    def _load_postgresql(self, rows):
+        """COPY into temporary staging table, then insert rows missing
+        in ingredient table in one statement."""
+        table = Ingredient._meta.db_table
+        copy_sql = ('COPY ingredient_staging (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)')
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging '
+                '(name text, measurement_unit text) ON COMMIT DROP')
+            rows_file = RowsFile(rows)
+            if hasattr(cursor, 'copy_expert'):
+                try:
+                    cursor.copy_expert(copy_sql, rows_file, size=READ_SIZE)
+                except Exception:
+                    if rows_file.error is not None:
+                        raise rows_file.error from None
+                    raise
+            else:
+                with cursor.copy(copy_sql) as copy:
+                    while data := rows_file.read(READ_SIZE):
+                        copy.write(data)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT name, measurement_unit FROM ingredient_staging '
+                f'ON CONFLICT (name, measurement_unit) DO NOTHING')
+            inserted = cursor.rowcount
+            # Command can be called again in the same transaction.
+            cursor.execute('DROP TABLE ingredient_staging')
+            return inserted
+
+    def _load_bulk_create(self, rows, batch_size):
+        count = Ingredient.objects.count()
+        while batch := list(islice(rows, batch_size)):
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name, measurement_unit=measurement_unit)
+                 for name, measurement_unit in batch],
+                ignore_conflicts=True,
+            )
+        return Ingredient.objects.count() - count
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in ('csv', 'json'):
+            raise CommandError('Use --format to set csv or json format.')
+        if not path.is_file():
+            raise CommandError(f'No such file {path}.')
+
+        self.processed = 0
+        self.skipped = 0
+        self.invalid = []
+        started = time.monotonic()
+
+        with open(path, encoding='utf-8', newline='') as file, \
+                transaction.atomic():
+            reader = iter_csv(file) if file_format == 'csv' else (
+                iter_json(file))
+            rows = self._clean_rows(reader)
+            if connection.vendor == 'postgresql':
+                inserted = self._load_postgresql(rows)
+            else:
+                inserted = self._load_bulk_create(
+                    rows, options['batch_size'])
+            transaction.on_commit(lambda: catalog.bump_version(Ingredient))
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {self.processed} rows, inserted {inserted}, '
+            f'skipped invalid {self.skipped} in {elapsed:.2f}s '
+            f'({self.processed / max(elapsed, 1e-6):.0f} rows/sec).'
+        ))
+        if self.invalid:
+            positions = ', '.join(map(str, self.invalid))
+            more = ', ...' if self.skipped > len(self.invalid) else ''
+            unit = 'lines' if file_format == 'csv' else 'items'
+            self.stdout.write(self.style.WARNING(
+                f'Invalid {unit}: {positions}{more}.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from foodgram.cart import rebuild_cart_totals
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Check shopping cart ingredient totals against shopping '
+            'carts and rewrite wrong ones. Users are processed by '
+            'primary key ranges, each range in separate transaction.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_pk = User.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+        wrong = 0
+
+        for start in range(0, max_pk + 1, batch_size):
+            wrong += len(rebuild_cart_totals(
+                User.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+                .values_list('pk', flat=True)))
+
+        self.stdout.write(f'Rebuilt shopping cart totals of {wrong} users.')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from foodgram.counters import recount
+from foodgram.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Repair denormalized counters of recipes and users. '
+            'Rows are processed by primary key ranges, '
+            'each range in separate transaction.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        for model, field, related_model, related_field in COUNTERS:
+            max_pk = model.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+            updated = 0
+
+            for start in range(0, max_pk + 1, batch_size):
+                queryset = model.objects.filter(
+                    pk__gte=start, pk__lt=start + batch_size)
+                with transaction.atomic():
+                    updated += recount(
+                        queryset, field, related_model, related_field)
+
+            self.stdout.write(
+                f'{model._meta.label}.{field}: recounted {updated} rows.')
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from foodgram.trending import update_trending_scores
+
+
+class Command(BaseCommand):
+    help = ('Update time-decayed trending scores of recipes once '
+            '(from cron) or every --interval seconds.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat every so many seconds.')
+
+    def update(self):
+        updated = update_trending_scores()
+        if updated is None:
+            self.stdout.write('Skipped, other update is running.')
+        else:
+            self.stdout.write(f'Updated trending score of {updated} recipes.')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        self.update()
+        while interval > 0:
+            time.sleep(interval)
+            close_old_connections()
+            self.update()
@@ -0,0 +1,39 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+INDEXES = (
+    ('ingredient_lower_name_prefix_idx',
+     'CREATE INDEX IF NOT EXISTS {} ON foodgram_ingredient '
+     '(lower(name) varchar_pattern_ops);'),
+    ('ingredient_lower_name_trgm_idx',
+     'CREATE INDEX IF NOT EXISTS {} ON foodgram_ingredient '
+     'USING gin (lower(name) gin_trgm_ops);'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    """Autocomplete indexes are PostgreSQL only, other databases
+    use in-process foodgram.search.IngredientPrefixIndex."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, sql in INDEXES:
+        schema_editor.execute(sql.format(name))
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name};')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0018_alter_recipe_options_recipe_pub_date_and_more'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
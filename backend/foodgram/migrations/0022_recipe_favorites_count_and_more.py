@@ -0,0 +1,56 @@
+# Generated by Django 4.2.4 on 2026-10-18 06:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(related_model, related_field):
+    return Coalesce(Subquery(
+        related_model.objects
+        .filter(**{related_field: OuterRef('pk')})
+        .order_by()
+        .values(related_field)
+        .annotate(count=Count('*'))
+        .values('count')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    Favorite = apps.get_model('foodgram', 'Favorite')
+    ShoppingCart = apps.get_model('foodgram', 'ShoppingCart')
+    Subscription = apps.get_model('users', 'Subscription')
+    User = apps.get_model('users', 'User')
+
+    Recipe.objects.update(
+        favorites_count=count_subquery(Favorite, 'recipe'),
+        shopping_carts_count=count_subquery(
+            ShoppingCart.recipes.through, 'recipe'),
+    )
+    User.objects.update(
+        recipes_count=count_subquery(Recipe, 'author'),
+        subscribers_count=count_subquery(Subscription, 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0021_recipe_pub_date_id_idx'),
+        ('users', '0003_user_recipes_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_carts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Recipe.tags through table has unique (recipe_id, tag_id) index for
+    EXISTS probes from recipe side, (tag_id, recipe_id) index lets tags
+    filter start from matched tags with index only scan."""
+
+    dependencies = [
+        ('foodgram', '0023_recipe_trending_score_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON foodgram_recipe_tags (tag_id, recipe_id);',
+            'DROP INDEX recipe_tags_tag_recipe_idx;',
+        ),
+    ]
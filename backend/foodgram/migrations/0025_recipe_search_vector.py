@@ -0,0 +1,54 @@
+# Generated by Django 4.2.4 on 2026-10-18 06:23
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# RECIPE_SEARCH_CONFIG at the time of migration.
+SEARCH_CONFIG = 'russian'
+
+FILL_SEARCH_VECTOR = '''
+UPDATE foodgram_recipe AS recipe SET search_vector =
+    setweight(to_tsvector(%(config)s, recipe.name), 'A')
+    || setweight(to_tsvector(%(config)s, coalesce((
+        SELECT string_agg(ingredient.name, ' ')
+        FROM foodgram_ingredienttorecipe AS item
+        JOIN foodgram_ingredient AS ingredient
+            ON ingredient.id = item.ingredient_id
+        WHERE item.recipe_id = recipe.id
+    ), '')), 'B')
+    || setweight(to_tsvector(%(config)s, recipe.text), 'C');
+'''
+
+
+def fill_search_vectors(apps, schema_editor):
+    """Full text search is PostgreSQL only, other databases
+    use in-process foodgram.search.RecipeSearchIndex."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        FILL_SEARCH_VECTOR, {'config': SEARCH_CONFIG})
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+        'ON foodgram_recipe USING gin (search_vector);')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx;')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0024_recipe_tags_tag_recipe_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_vectors, drop_search_index),
+    ]
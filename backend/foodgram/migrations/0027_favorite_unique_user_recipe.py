@@ -0,0 +1,40 @@
+# Generated by Django 4.2.4 on 2026-10-18 06:29
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+from django.db.models.functions import Greatest
+
+
+def delete_duplicates(apps, schema_editor):
+    """Keep the first Favorite of every user/recipe pair,
+    decrease favorites_count of recipe by deleted rows."""
+    Favorite = apps.get_model('foodgram', 'Favorite')
+    Recipe = apps.get_model('foodgram', 'Recipe')
+
+    duplicates = (
+        Favorite.objects.values('user', 'recipe')
+        .annotate(first_id=Min('id'), amount=Count('id'))
+        .filter(amount__gt=1)
+        .order_by()
+    )
+    for row in duplicates.iterator():
+        deleted, _ = Favorite.objects.filter(
+            user=row['user'], recipe=row['recipe'],
+        ).exclude(id=row['first_id']).delete()
+        Recipe.objects.filter(id=row['recipe']).update(
+            favorites_count=Greatest(F('favorites_count') - deleted, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0026_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='Unique user/recipe favorite constraint.'),
+        ),
+    ]
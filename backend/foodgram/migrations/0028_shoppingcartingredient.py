@@ -0,0 +1,55 @@
+# Generated by Django 4.2.4 on 2026-10-18 06:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def fill_cart_totals(apps, schema_editor):
+    """Aggregate ingredients of recipes in existing shopping carts."""
+    IngredientToRecipe = apps.get_model('foodgram', 'IngredientToRecipe')
+    ShoppingCartIngredient = apps.get_model(
+        'foodgram', 'ShoppingCartIngredient')
+
+    rows = (
+        IngredientToRecipe.objects
+        .filter(recipe__shopping_carts__isnull=False)
+        .values_list('recipe__shopping_carts__user', 'ingredient')
+        .annotate(total_amount=Sum('amount'), recipes_count=Count('id'))
+        .order_by()
+    )
+    ShoppingCartIngredient.objects.bulk_create(
+        (ShoppingCartIngredient(
+            user_id=user_id, ingredient_id=ingredient_id,
+            total_amount=total_amount, recipes_count=recipes_count)
+         for user_id, ingredient_id, total_amount, recipes_count
+         in rows.iterator()),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('foodgram', '0027_favorite_unique_user_recipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.IntegerField(default=0)),
+                ('recipes_count', models.IntegerField(default=0)),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to='foodgram.ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_ingredients', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='Unique user/ingredient cart total constraint.'),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
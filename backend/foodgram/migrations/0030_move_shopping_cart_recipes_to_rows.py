@@ -0,0 +1,33 @@
+# Generated by Django 4.2.4 on 2026-10-18 06:52
+
+from django.db import migrations
+import django.utils.timezone
+
+
+def move_recipes_to_rows(apps, schema_editor):
+    """Make one ShoppingCart row per recipe of every old cart,
+    old cart rows (without recipe) are deleted with their m2m rows."""
+    ShoppingCart = apps.get_model('foodgram', 'ShoppingCart')
+    now = django.utils.timezone.now()
+
+    rows = ShoppingCart.recipes.through.objects.values_list(
+        'shoppingcart__user', 'recipe').order_by('id')
+    ShoppingCart.objects.bulk_create(
+        (ShoppingCart(user_id=user_id, recipe_id=recipe_id, added_at=now)
+         for user_id, recipe_id in rows.iterator()),
+        batch_size=5000,
+    )
+    ShoppingCart.objects.filter(recipe__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+    """Data only: PostgreSQL can't alter table with pending deferred
+    foreign key checks of inserted rows in the same transaction."""
+
+    dependencies = [
+        ('foodgram', '0029_shoppingcart_user_recipe_rows'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_recipes_to_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.4 on 2026-10-18 06:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0030_move_shopping_cart_recipes_to_rows'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='shoppingcart',
+            name='recipes',
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shopping_carts', to='foodgram.recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='Unique user/recipe shopping cart constraint.'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['recipe', 'user'], name='shoppingcart_recipe_user_idx'),
+        ),
+    ]
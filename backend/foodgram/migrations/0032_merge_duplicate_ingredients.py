@@ -0,0 +1,73 @@
+# Generated by Django 4.2.4 on 2026-10-18 06:16
+
+from django.db import migrations
+from django.db.models import Count, F, Min, Sum
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Keep the first Ingredient of every name/measurement_unit pair.
+    Recipe rows of duplicates are moved to it, amounts are summed
+    if recipe already has the kept ingredient. Shopping cart totals
+    of users with changed recipes are aggregated again."""
+    Ingredient = apps.get_model('foodgram', 'Ingredient')
+    IngredientToRecipe = apps.get_model('foodgram', 'IngredientToRecipe')
+    ShoppingCart = apps.get_model('foodgram', 'ShoppingCart')
+    ShoppingCartIngredient = apps.get_model(
+        'foodgram', 'ShoppingCartIngredient')
+
+    duplicates = (
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(first_id=Min('id'), amount=Count('id'))
+        .filter(amount__gt=1)
+        .order_by()
+    )
+    changed_recipes = set()
+    for row in duplicates.iterator():
+        duplicate_ids = list(Ingredient.objects.filter(
+            name=row['name'], measurement_unit=row['measurement_unit'],
+        ).exclude(id=row['first_id']).values_list('id', flat=True))
+
+        for item in IngredientToRecipe.objects.filter(
+                ingredient_id__in=duplicate_ids):
+            updated = IngredientToRecipe.objects.filter(
+                recipe_id=item.recipe_id, ingredient_id=row['first_id'],
+            ).update(amount=F('amount') + item.amount)
+            changed_recipes.add(item.recipe_id)
+            if updated:
+                item.delete()
+            else:
+                item.ingredient_id = row['first_id']
+                item.save(update_fields=('ingredient',))
+
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+    user_ids = set(ShoppingCart.objects.filter(
+        recipe_id__in=changed_recipes).values_list('user_id', flat=True))
+    ShoppingCartIngredient.objects.filter(user_id__in=user_ids).delete()
+    ShoppingCartIngredient.objects.bulk_create(
+        ShoppingCartIngredient(
+            user_id=user_id, ingredient_id=ingredient_id,
+            total_amount=total_amount, recipes_count=recipes_count)
+        for user_id, ingredient_id, total_amount, recipes_count in (
+            IngredientToRecipe.objects
+            .filter(recipe__shopping_carts__user__in=user_ids)
+            .values_list('recipe__shopping_carts__user', 'ingredient')
+            .annotate(total_amount=Sum('amount'), recipes_count=Count('id'))
+            .order_by()
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    """Data only, unique constraint is added by the next migration:
+    PostgreSQL can't alter tables with pending deferred foreign key
+    checks of changed rows in the same transaction."""
+
+    dependencies = [
+        ('foodgram', '0031_shoppingcart_recipe_required'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+    ]
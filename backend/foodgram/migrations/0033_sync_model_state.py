@@ -0,0 +1,39 @@
+# Generated by Django 4.2.4 on 2026-10-18 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Model state that was changed in models.py without migration:
+    Recipe name length, unique Ingredient name/unit and
+    renamed recipe/ingredient constraint (same fields, so existing rows
+    can't break it)."""
+
+    dependencies = [
+        ('foodgram', '0032_merge_duplicate_ingredients'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ingredienttorecipe',
+            name='Unique pair constraint.',
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='name',
+            field=models.CharField(max_length=200, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='pub_date',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='Unique name/measurement_unit constraint.'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredienttorecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='Unique recipe/ingredient constraint.'),
+        ),
+    ]
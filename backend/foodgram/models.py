@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from users.models import User
 
@@ -54,7 +55,17 @@ class Recipe(models.Model):
     """Recipe model.
 
     tag and ingredients - m2m fields.
-    ingredients - make relations through IngredientToRecipe model."""
+    ingredients - make relations through IngredientToRecipe model.
+    image_variants - thumbnails names by width and format,
+        filled in background by foodgram.images.make_thumbnails.
+    favorites_count and shopping_carts_count - denormalized counters,
+        see foodgram.counters and 'recount' command.
+    trending_score, trending_base, trending_updated_at - time-decayed
+        popularity, see foodgram.trending.
+    search_vector - weighted name, ingredient names and text,
+        maintained on PostgreSQL only, see foodgram.search.
+    updated_at - change time for conditional requests, updated by save()
+        and thumbnails, not by counters."""
     author = models.ForeignKey(
         User, related_name='recipes',
         on_delete=models.CASCADE,
@@ -74,6 +85,10 @@ class Recipe(models.Model):
         default=None,
         blank=False,
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+    )
     text = models.TextField(
         max_length=600,
         null=False,
@@ -95,9 +110,40 @@ class Recipe(models.Model):
         to=Ingredient,
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        default=0,
+    )
+    trending_score = models.FloatField(
+        default=0,
+    )
+    trending_base = models.PositiveIntegerField(
+        default=0,
+    )
+    trending_updated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+    )
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['-favorites_count', '-id'],
+                         name='recipe_popular_idx'),
+            models.Index(fields=['-trending_score', '-id'],
+                         name='recipe_trending_idx'),
+        ]
 
 
 class IngredientToRecipe(models.Model):
@@ -149,17 +195,84 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='Unique user/recipe favorite constraint.',
+            )
+        ]
+
 
 class ShoppingCart(models.Model):
-    """Additional model for recipe 'following'.
-    Difference is that objects in shopping cart can be presented like
-    'amount of ingredients to buy' through 'download_shopping_cart' func."""
-    user = models.OneToOneField(
+    """Recipe in user shopping cart, one row per user/recipe pair.
+    Difference from Favorite is that recipes in shopping cart can be
+    presented like 'amount of ingredients to buy' through
+    'download_shopping_cart' func.
+
+    Unique constraint (user, recipe) and index (recipe, user) cover
+    lookups from both sides, so separate foreign key indexes are off."""
+    user = models.ForeignKey(
         User, related_name='shopping_cart',
-        blank=False,
         null=False,
+        blank=False,
         on_delete=models.CASCADE,
+        db_index=False,
     )
-    recipes = models.ManyToManyField(
+    recipe = models.ForeignKey(
         Recipe, related_name='shopping_carts',
+        null=False,
+        blank=False,
+        on_delete=models.CASCADE,
+        db_index=False,
     )
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='Unique user/recipe shopping cart constraint.',
+            )
+        ]
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='shoppingcart_recipe_user_idx'),
+        ]
+
+
+class ShoppingCartIngredient(models.Model):
+    """Materialized ingredient totals of user shopping cart, read by
+    'download_shopping_cart' instead of aggregating recipes.
+
+    total_amount - sum of ingredient amounts in recipes of cart.
+    recipes_count - amount of recipes in cart with this ingredient,
+        row is deleted when it drops to zero.
+    Maintained incrementally by foodgram.cart, 'rebuild_cart_totals'
+    command checks and rebuilds it from shopping carts."""
+    user = models.ForeignKey(
+        User, related_name='shopping_cart_ingredients',
+        null=False,
+        blank=False,
+        on_delete=models.CASCADE,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, related_name='shopping_cart_totals',
+        null=False,
+        blank=False,
+        on_delete=models.CASCADE,
+    )
+    total_amount = models.IntegerField(
+        default=0,
+    )
+    recipes_count = models.IntegerField(
+        default=0,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='Unique user/ingredient cart total constraint.',
+            )
+        ]
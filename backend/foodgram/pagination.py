@@ -1,7 +1,113 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomWithLimitPagination(PageNumberPagination):
     """Custom pagination with limited objects on page
     through 'limit' query parameter."""
     page_size_query_param = 'limit'
+
+
+class RecipePagination(CustomWithLimitPagination):
+    """Page number pagination with opt-in keyset mode for recipe feed.
+
+    '?cursor=' - switches to keyset mode: no COUNT(*) and no OFFSET,
+    page is taken by (pub_date, id) position of last seen recipe, which
+    is served by Recipe composite index. 'limit' works in both modes.
+    Cursor encodes direction and position: '<n|p>|<pub_date>|<id>'.
+    Querysets with other ordering ('?ordering=', search rank, ingredient
+    coverage) work only in page number mode, cursor is refused for them."""
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor.'
+    # Explicit orderings of queryset compatible with (pub_date, id) keyset,
+    # empty one means model default ordering.
+    keyset_orderings = ((), ('-pub_date',), ('-pub_date', '-id'))
+
+    def _encode_cursor(self, direction, recipe):
+        position = f'{direction}|{recipe.pub_date.isoformat()}|{recipe.id}'
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def _decode_cursor(self, cursor):
+        try:
+            position = base64.urlsafe_b64decode(cursor.encode()).decode()
+            direction, pub_date, pk = position.split('|')
+            pub_date, pk = parse_datetime(pub_date), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if direction not in ('n', 'p') or pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return direction, pub_date, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        if (tuple(queryset.query.order_by) not in self.keyset_orderings
+                or queryset.query.extra_order_by):
+            raise ValidationError({self.cursor_query_param: (
+                'Cursor pagination supports only default ordering.')})
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = request.query_params[self.cursor_query_param]
+        direction, pub_date, pk = (
+            self._decode_cursor(cursor) if cursor else ('n', None, None))
+
+        if direction == 'n':
+            queryset = queryset.order_by('-pub_date', '-id')
+            if pub_date is not None:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk))
+        else:
+            queryset = queryset.order_by('pub_date', 'id').filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk))
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+
+        if direction == 'p':
+            results.reverse()
+            self.has_next, self.has_previous = bool(results), has_more
+        else:
+            self.has_next, self.has_previous = has_more, pub_date is not None
+
+        self.results = results
+        return results
+
+    def _get_cursor_link(self, direction, recipe):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param,
+                                   self._encode_cursor(direction, recipe))
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return self._get_cursor_link('n', self.results[-1])
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous or not self.results:
+            return None
+        return self._get_cursor_link('p', self.results[0])
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
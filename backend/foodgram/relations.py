@@ -0,0 +1,58 @@
+from django.core.cache import cache
+from django.db import transaction
+from foodgram.cache import bump_user_relations_version, get_user_relations_key
+from foodgram.models import Favorite, ShoppingCart
+from users.models import Subscription
+from foodgram_backend.settings import USER_RELATIONS_CACHE_TIMEOUT
+
+
+class UserRelations:
+    """Ids of recipes in favorite and shopping cart of user
+    and ids of authors user subscribed on."""
+    def __init__(self, favorites=(), shopping_cart=(), subscriptions=()):
+        self.favorites = frozenset(favorites)
+        self.shopping_cart = frozenset(shopping_cart)
+        self.subscriptions = frozenset(subscriptions)
+
+
+def _load(user):
+    return UserRelations(
+        Favorite.objects.filter(user=user).values_list(
+            'recipe_id', flat=True),
+        ShoppingCart.objects.filter(user=user).values_list(
+            'recipe_id', flat=True),
+        Subscription.objects.filter(user=user).values_list(
+            'author_id', flat=True),
+    )
+
+
+def get_user_relations(request):
+    """UserRelations of request user, empty for anonymous.
+
+    Loaded with three queries and kept in request and in cache for
+    USER_RELATIONS_CACHE_TIMEOUT seconds under user relations version."""
+    relations = getattr(request, '_user_relations', None)
+    if relations is not None:
+        return relations
+
+    user = request.user
+    if user.is_anonymous:
+        relations = UserRelations()
+    else:
+        key = get_user_relations_key(user.id)
+        relations = cache.get(key)
+        if relations is None:
+            relations = _load(user)
+            cache.set(key, relations, USER_RELATIONS_CACHE_TIMEOUT)
+
+    request._user_relations = relations
+    return relations
+
+
+def invalidate_user_relations(request):
+    """Call when favorite, shopping cart or subscriptions of request user
+    changed. Version is bumped after commit, so relations can't be
+    cached before changes are visible."""
+    request._user_relations = None
+    user_id = request.user.id
+    transaction.on_commit(lambda: bump_user_relations_version(user_id))
@@ -0,0 +1,117 @@
+import abc
+import csv
+import io
+import os
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import exceptions, renderers
+from rest_framework.negotiation import DefaultContentNegotiation
+from foodgram_backend.settings import PDF_FONT_PATH
+
+
+class ShoppingCartRenderer(renderers.BaseRenderer, metaclass=abc.ABCMeta):
+    """Base renderer for 'download_shopping_cart' file.
+
+    Chosen through '?format=' query parameter or Accept header.
+    stream() - yields encoded file chunks for ingredient rows
+        (name, total_amount, measurement_unit).
+    render() - used only for error responses of the action."""
+    charset = 'utf-8'
+    title = 'Cписок покупок:'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and 'detail' in data:
+            data = data['detail']
+        return str(data).encode(self.charset)
+
+    @abc.abstractmethod
+    def stream(self, rows):
+        pass
+
+
+class TxtShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield self.title.encode(self.charset)
+        for row in rows:
+            yield '\n{} - {} {}.'.format(*row).encode(self.charset)
+
+
+class _Echo:
+    """File-like object for csv.writer, returns written line."""
+    def write(self, value):
+        return value
+
+
+class CsvShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(
+            ('name', 'amount', 'measurement_unit')).encode(self.charset)
+        for row in rows:
+            yield writer.writerow(row).encode(self.charset)
+
+
+class PdfShoppingCartRenderer(ShoppingCartRenderer):
+    """PDF document can't be written before all rows are known
+    (page layout and xref table), so it is built at once and then
+    yielded by chunks."""
+    media_type = 'application/pdf'
+    format = 'pdf'
+    chunk_size = 64 * 1024
+    font_size = 12
+    margin = 50
+
+    def _get_font_name(self):
+        if not os.path.exists(PDF_FONT_PATH):
+            return 'Helvetica'
+        if 'ShoppingCartFont' not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont('ShoppingCartFont', PDF_FONT_PATH))
+        return 'ShoppingCartFont'
+
+    def stream(self, rows):
+        buffer = io.BytesIO()
+        font_name = self._get_font_name()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        line_height = self.font_size * 1.5
+        y = height - self.margin
+
+        pdf.setFont(font_name, self.font_size)
+        for line in [self.title] + ['{} - {} {}.'.format(*row)
+                                    for row in rows]:
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font_name, self.font_size)
+                y = height - self.margin
+            pdf.drawString(self.margin, y, line)
+            y -= line_height
+        pdf.save()
+
+        buffer.seek(0)
+        while chunk := buffer.read(self.chunk_size):
+            yield chunk
+
+
+class ShoppingCartContentNegotiation(DefaultContentNegotiation):
+    """Accept header without file media types (like 'application/json'
+    of API clients) gets the first renderer, txt. Unknown '?format='
+    is still 404."""
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except exceptions.NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
+SHOPPING_CART_RENDERERS = (TxtShoppingCartRenderer,
+                           CsvShoppingCartRenderer,
+                           PdfShoppingCartRenderer)
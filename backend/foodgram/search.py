@@ -0,0 +1,218 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection, transaction
+from django.db.models import (Case, Count, F, FloatField, OuterRef, Q,
+                              Subquery, TextField, Value, When)
+from django.db.models.functions import Cast, Coalesce
+from foodgram.cache import (bump_recipes_search_version,
+                            get_recipes_search_version)
+from foodgram.catalog import catalog
+from foodgram.models import Ingredient, IngredientToRecipe, Recipe
+from foodgram_backend.settings import (RECIPE_SEARCH_CONFIG,
+                                       RECIPE_SEARCH_FALLBACK_LIMIT)
+
+
+class IngredientPrefixIndex:
+    """In-process autocomplete index for Ingredient model.
+
+    Used when database has no trigram index (SQLite).
+    Ingredients from catalog are kept sorted by lowercased name, so prefix
+    matches are found with binary search, substring matches with one scan.
+    Index is rebuilt when catalog version of Ingredient changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._keys = []
+        self._items = []
+
+    def _build(self, ingredients):
+        ingredients = sorted(
+            ingredients, key=lambda item: (item.name.lower(), item.pk))
+        self._keys = [item.name.lower() for item in ingredients]
+        self._items = ingredients
+
+    def search(self, search, limit):
+        """Return up to 'limit' ingredients, prefix matches first."""
+        version = catalog.version(Ingredient)
+
+        with self._lock:
+            if self._version != version:
+                self._build(catalog.all(Ingredient))
+                self._version = version
+            keys, items = self._keys, self._items
+
+        result = []
+        position = bisect_left(keys, search)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(search)):
+            result.append(items[position])
+            position += 1
+
+        for key, item in zip(keys, items):
+            if len(result) >= limit:
+                break
+            if search in key and not key.startswith(search):
+                result.append(item)
+
+        return result
+
+
+ingredient_prefix_index = IngredientPrefixIndex()
+
+
+def _tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+
+class RecipeSearchIndex:
+    """In-process inverted index for recipe search.
+
+    Used when database has no full text search (SQLite).
+    Term postings keep rank of recipe: weighted term frequency in name,
+    ingredient names and text, like A, B and C weights on PostgreSQL.
+    Every search term should match. Index is rebuilt when recipes search
+    version or Ingredient catalog version changes."""
+    weights = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}
+
+    def _build(self):
+        ingredient_names = defaultdict(list)
+        for recipe_id, ingredient_id in (
+                IngredientToRecipe.objects
+                .values_list('recipe_id', 'ingredient_id').iterator()):
+            ingredient = catalog.get(Ingredient, ingredient_id)
+            if ingredient is not None:
+                ingredient_names[recipe_id].append(ingredient.name)
+
+        postings = defaultdict(dict)
+        for recipe_id, name, text in (
+                Recipe.objects.values_list('id', 'name', 'text').iterator()):
+            fields = {'name': name, 'text': text,
+                      'ingredients': ' '.join(ingredient_names[recipe_id])}
+            for field, weight in self.weights.items():
+                for term in _tokenize(fields[field]):
+                    ranks = postings[term]
+                    ranks[recipe_id] = ranks.get(recipe_id, 0) + weight
+
+        return dict(postings)
+
+    def search(self, search):
+        """Return {recipe_id: rank} of recipes matching all terms."""
+        version = (get_recipes_search_version(), catalog.version(Ingredient))
+
+        with self._lock:
+            if self._version != version:
+                self._postings = self._build()
+                self._version = version
+            postings = self._postings
+
+        result = None
+        for term in set(_tokenize(search)):
+            ranks = postings.get(term, {})
+            result = dict(ranks) if result is None else {
+                pk: rank + ranks[pk]
+                for pk, rank in result.items() if pk in ranks}
+            if not result:
+                break
+
+        return result or {}
+
+
+recipe_search_index = RecipeSearchIndex()
+
+
+def recipe_search_vector():
+    """Expression of Recipe.search_vector for UPDATE."""
+    ingredient_names = (
+        IngredientToRecipe.objects.filter(recipe=OuterRef('pk'))
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=RECIPE_SEARCH_CONFIG)
+        + SearchVector(Coalesce(Subquery(ingredient_names), Value(''),
+                                output_field=TextField()),
+                       weight='B', config=RECIPE_SEARCH_CONFIG)
+        + SearchVector('text', weight='C', config=RECIPE_SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(recipe_ids):
+    """Recompute search vectors of recipes. Saves of Recipe and
+    IngredientToRecipe call it through signals, call it after bulk
+    changes of recipes or ingredient rows.
+    recipe_ids - list or values queryset of ids."""
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            search_vector=recipe_search_vector())
+    else:
+        transaction.on_commit(bump_recipes_search_version)
+
+
+def search_recipes(queryset, search):
+    """Filter queryset by search string and order it by rank.
+    On PostgreSQL served by GIN index of Recipe.search_vector,
+    on other databases by in-process RecipeSearchIndex, limited to
+    RECIPE_SEARCH_FALLBACK_LIMIT best ranked (newer first) recipes."""
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(search, config=RECIPE_SEARCH_CONFIG,
+                            search_type='websearch')
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query))
+    else:
+        ranks = dict(heapq.nlargest(
+            RECIPE_SEARCH_FALLBACK_LIMIT,
+            recipe_search_index.search(search).items(),
+            key=lambda item: (item[1], item[0])))
+        if not ranks:
+            return queryset.none()
+        queryset = queryset.filter(id__in=ranks).annotate(
+            search_rank=Case(
+                *[When(id=pk, then=Value(rank))
+                  for pk, rank in ranks.items()],
+                output_field=FloatField(),
+            ))
+
+    return queryset.order_by('-search_rank', '-pub_date', '-id')
+
+
+def match_ingredients(queryset, ingredient_ids, missing=None):
+    """Recipes having any of ingredient_ids ordered by coverage
+    (matched ingredients / all recipe ingredients).
+
+    missing - max amount of recipe ingredients not in ingredient_ids.
+    Counted in one grouped query over recipe ingredient rows, candidate
+    recipes are found by ingredient index of IngredientToRecipe."""
+    queryset = queryset.filter(id__in=IngredientToRecipe.objects.filter(
+        ingredient_id__in=ingredient_ids).values('recipe_id'))
+    queryset = queryset.annotate(
+        ingredients_total=Count('ingredient'),
+        ingredients_matched=Count(
+            'ingredient',
+            filter=Q(ingredient__ingredient_id__in=ingredient_ids)),
+    ).annotate(
+        coverage=Cast('ingredients_matched', FloatField())
+        / F('ingredients_total'),
+    )
+
+    if missing is not None:
+        queryset = queryset.alias(
+            ingredients_missing=F('ingredients_total')
+            - F('ingredients_matched'),
+        ).filter(ingredients_missing__lte=missing)
+
+    return queryset.order_by(
+        '-coverage', '-ingredients_matched', '-pub_date', '-id')
@@ -1,25 +1,57 @@
+from django.db import transaction
 from django.db.transaction import atomic
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from drf_base64.fields import Base64ImageField
 from users.serializers import CustomReadUserSerializer
-from users.models import User, Subscription
-from foodgram.models import (Tag, Ingredient, Recipe, IngredientToRecipe,
-                             Favorite, ShoppingCart)
+from users.models import User
+from foodgram_backend.settings import BATCH_IDS_MAX, RECIPES_LIMIT_MAX
+from foodgram.catalog import catalog
+from foodgram.cache import bump_recipes_version
+from foodgram.fields import (BulkPrimaryKeyListField,
+                             BulkRelatedListSerializer,
+                             StreamingBase64ImageField, ImageVariantsField)
+from foodgram.images import schedule_thumbnails
+from foodgram.relations import get_user_relations
+from foodgram.search import update_search_vectors
+from foodgram.counters import change_counter
+from foodgram.cart import change_recipe_in_carts
+from foodgram.models import Tag, Ingredient, Recipe, IngredientToRecipe
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Represents short list of fields for Recipe model for some
     specific endpoints."""
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+
+def get_recipes_limit(query_params):
+    """Parse 'recipes_limit' query param.
+
+    Missing or invalid values fall back to RECIPES_LIMIT_MAX,
+    greater values are capped by it."""
+    try:
+        recipes_limit = int(query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return RECIPES_LIMIT_MAX
+
+    if recipes_limit <= 0:
+        return RECIPES_LIMIT_MAX
+
+    return min(recipes_limit, RECIPES_LIMIT_MAX)
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
-    """Serializer for SubscriptionViewSet."""
+    """Serializer for SubscriptionViewSet.
+
+    is_subscribed and recipes_preview are expected to be
+    annotated by SubscriptionsViewSet, otherwise is_subscribed is taken
+    from user relations and recipes are queried.
+    recipes_count - denormalized User counter."""
     is_subscribed = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
 
     class Meta:
@@ -32,31 +64,24 @@ class SubscriptionSerializer(serializers.ModelSerializer):
                   'recipes',
                   'recipes_count',
                   )
+        read_only_fields = ('recipes_count',)
         model = User
 
-    def _is_valid_query_params(self, query_params):
-        recipes_limit = query_params['recipes_limit']
-
-        return isinstance(recipes_limit, int) and recipes_limit > 0
-
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Subscription.objects.filter(user=user, author=obj).exists()
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.id in get_user_relations(
+            self.context['request']).subscriptions
 
     def get_recipes(self, obj):
         """Through this method we can limit recipe count for
         each user in sent data."""
-        queryset = Recipe.objects.filter(author=obj)
-        query_params = self.context['request'].query_params
-
-        if query_params:
-            if self._is_valid_query_params(query_params):
-                queryset = queryset[:query_params['recipes_limit']]
+        if hasattr(obj, 'recipes_preview'):
+            queryset = obj.recipes_preview
+        else:
+            recipes_limit = get_recipes_limit(
+                self.context['request'].query_params)
+            queryset = Recipe.objects.filter(author=obj)[:recipes_limit]
 
         serializer = ShortRecipeSerializer(
             queryset, many=True, context=self.context)
@@ -64,6 +89,14 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return serializer.data
 
 
+class BatchIdsSerializer(serializers.Serializer):
+    """Recipe or author ids of batch favorite, shopping cart
+    and subscribe endpoints, at most BATCH_IDS_MAX."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=BATCH_IDS_MAX)
+
+
 class TagSerializer(serializers.ModelSerializer):
     """Serializer for Tag model."""
     class Meta:
@@ -83,17 +116,26 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 class IngredientToRecipeSerializer(serializers.ModelSerializer):
     """Through this serializer implemented
-    'Ingredient' + 'amount' representation."""
-    id = serializers.ReadOnlyField(source='ingredient.id')
-    name = serializers.ReadOnlyField(source='ingredient.name')
-    measurement_unit = serializers.ReadOnlyField(
-        source='ingredient.measurement_unit')
+    'Ingredient' + 'amount' representation.
+    Ingredient name and measurement_unit are taken from catalog cache."""
+    id = serializers.ReadOnlyField(source='ingredient_id')
+    name = serializers.SerializerMethodField()
+    measurement_unit = serializers.SerializerMethodField()
 
     class Meta:
         model = IngredientToRecipe
         fields = ('id', 'name',
                   'measurement_unit', 'amount')
 
+    def _get_ingredient(self, obj):
+        return catalog.get(Ingredient, obj.ingredient_id) or obj.ingredient
+
+    def get_name(self, obj):
+        return self._get_ingredient(obj).name
+
+    def get_measurement_unit(self, obj):
+        return self._get_ingredient(obj).measurement_unit
+
 
 class RecipeSerializer(serializers.ModelSerializer):
     """Read recipe serializer."""
@@ -104,20 +146,30 @@ class RecipeSerializer(serializers.ModelSerializer):
     author = CustomReadUserSerializer(many=False, read_only=True)
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        exclude = ('pub_date',)
+        exclude = ('pub_date', 'shopping_carts_count', 'trending_score',
+                   'trending_base', 'trending_updated_at', 'search_vector',
+                   'updated_at')
 
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        return False if user.is_anonymous else Favorite.objects.filter(
-            recipe=obj, user=user).exists()
+        """Flags are taken from user relations of request user."""
+        return obj.id in get_user_relations(
+            self.context['request']).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        return False if user.is_anonymous else ShoppingCart.objects.filter(
-            recipes=obj, user=user).exists()
+        return obj.id in get_user_relations(
+            self.context['request']).shopping_cart
+
+
+class RecipeMatchSerializer(RecipeSerializer):
+    """Read recipe serializer with ingredient coverage
+    annotated by foodgram.search.match_ingredients()."""
+    ingredients_matched = serializers.IntegerField(read_only=True)
+    ingredients_total = serializers.IntegerField(read_only=True)
+    coverage = serializers.FloatField(read_only=True)
 
 
 class AddIngredientToRecipeSerializer(serializers.ModelSerializer):
@@ -128,33 +180,33 @@ class AddIngredientToRecipeSerializer(serializers.ModelSerializer):
 
     to_representation - uses RecipeSerializer because here some difference in
     serializing ingredients field."""
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = IngredientToRecipe
         fields = ('id', 'amount')
+        list_serializer_class = BulkRelatedListSerializer
+        related_queryset = Ingredient.objects.all()
         extra_kwargs = {'amount': {'required': True},
                         'id': {'required': True}}
 
 
 class AddRecipeSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyListField(
         queryset=Tag.objects.all(),
-        many=True, allow_empty=False, allow_null=False, required=True)
+        allow_empty=False, allow_null=False, required=True)
 
     ingredients = AddIngredientToRecipeSerializer(
         many=True, allow_null=False, allow_empty=False, required=True)
 
-    image = Base64ImageField(required=True)
+    image = StreamingBase64ImageField(required=True)
 
     class Meta:
         model = Recipe
-        partial_update = False
         fields = ('ingredients', 'tags', 'name', 'text',
                   'cooking_time', 'image',)
 
-    def validate(self, attrs):
-        ingredients = attrs.get('ingredients')
+    def _validate_ingredients(self, ingredients):
         if not ingredients:
             raise ValidationError(
                 detail={'ingredients': 'field is required.'}
@@ -180,7 +232,7 @@ class AddRecipeSerializer(serializers.ModelSerializer):
                 detail={'ingredients': 'only unique values.'}
             )
 
-        tags = attrs.get('tags')
+    def _validate_tags(self, tags):
         if not tags:
             raise ValidationError(
                 detail={'tags': 'field is required.'}
@@ -191,6 +243,14 @@ class AddRecipeSerializer(serializers.ModelSerializer):
                 detail={'tags': 'only unique values.'}
             )
 
+    def validate(self, attrs):
+        """ingredients and tags may be omitted only on PATCH."""
+        if not self.partial or 'ingredients' in attrs:
+            self._validate_ingredients(attrs.get('ingredients'))
+
+        if not self.partial or 'tags' in attrs:
+            self._validate_tags(attrs.get('tags'))
+
         cooking_time = attrs.get('cooking_time')
         if cooking_time is not None and cooking_time < 1:
             raise ValidationError(
@@ -204,6 +264,7 @@ class AddRecipeSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(
             **validated_data, author=self.context['request'].user)
+        change_counter(User, recipe.author_id, 'recipes_count', 1)
         recipe.tags.set(tags)
 
         to_save = [
@@ -212,33 +273,89 @@ class AddRecipeSerializer(serializers.ModelSerializer):
                                recipe=recipe) for item in ingredients]
 
         IngredientToRecipe.objects.bulk_create(to_save)
+        # Vector made on save has no ingredient names yet.
+        update_search_vectors([recipe.id])
+        schedule_thumbnails(recipe)
 
         return recipe
 
     def to_representation(self, instance):
         return RecipeSerializer(instance, context=self.context).data
 
+    def _update_tags(self, instance, tags):
+        """Add and remove only changed tags."""
+        current = set(instance.tags.values_list('id', flat=True))
+        new = {tag.id for tag in tags}
+
+        if current - new:
+            instance.tags.remove(*(current - new))
+        if new - current:
+            instance.tags.add(*(new - current))
+
+    def _update_ingredients(self, instance, ingredients):
+        """Apply difference between current and new ingredient rows:
+        one bulk_create, one bulk_update and one delete at most,
+        then the same difference to shopping cart totals."""
+        current = {
+            row.ingredient_id: row
+            for row in IngredientToRecipe.objects.filter(recipe=instance)
+        }
+        new = {item['id'].id: item['amount'] for item in ingredients}
+
+        to_create = [
+            IngredientToRecipe(ingredient_id=ingredient_id,
+                               amount=amount,
+                               recipe=instance)
+            for ingredient_id, amount in new.items()
+            if ingredient_id not in current
+        ]
+        to_update = []
+        old_amounts = {}
+        for ingredient_id, amount in new.items():
+            row = current.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                old_amounts[ingredient_id] = row.amount
+                row.amount = amount
+                to_update.append(row)
+        to_delete = current.keys() - new.keys()
+
+        if to_delete:
+            IngredientToRecipe.objects.filter(
+                recipe=instance, ingredient_id__in=to_delete).delete()
+        if to_update:
+            IngredientToRecipe.objects.bulk_update(to_update, ('amount',))
+        if to_create:
+            IngredientToRecipe.objects.bulk_create(to_create)
+
+        if to_create or to_update or to_delete:
+            change_recipe_in_carts(instance.id, {
+                **{row.ingredient_id: (row.amount, 1) for row in to_create},
+                **{row.ingredient_id: (row.amount - old_amounts[
+                    row.ingredient_id], 0) for row in to_update},
+                **{ingredient_id: (-current[ingredient_id].amount, -1)
+                   for ingredient_id in to_delete},
+            })
+            transaction.on_commit(bump_recipes_version)
+
     @atomic
     def update(self, instance, validated_data):
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time)
-        instance.image = validated_data.get('image', instance.image)
+        if 'image' in validated_data:
+            instance.image = validated_data['image']
+            instance.image_variants = {}
 
-        tags = validated_data.pop('tags')
-        instance.tags.set(tags)
-
-        ingredients = validated_data.pop('ingredients')
-        IngredientToRecipe.objects.filter(
-            recipe=instance,
-            ingredient__in=instance.ingredients.all()).delete()
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            self._update_tags(instance, tags)
 
-        to_save = [
-            IngredientToRecipe(ingredient=item['id'],
-                               amount=item['amount'],
-                               recipe=instance) for item in ingredients]
-        IngredientToRecipe.objects.bulk_create(to_save)
+        ingredients = validated_data.pop('ingredients', None)
+        if ingredients is not None:
+            self._update_ingredients(instance, ingredients)
 
         instance.save()
+        if 'image' in validated_data:
+            schedule_thumbnails(instance)
         return instance
@@ -0,0 +1,66 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from foodgram.cache import bump_recipes_generation, bump_recipes_version
+from foodgram.cart import remove_recipe_from_carts
+from foodgram.catalog import catalog
+from foodgram.models import Ingredient, IngredientToRecipe, Recipe, Tag
+from foodgram.search import update_search_vectors
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_catalog_version(sender, **kwargs):
+    """Bump after commit, otherwise other workers can reload catalog
+    before changes are visible to them."""
+    transaction.on_commit(lambda: catalog.bump_version(sender))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def bump_recipes_cache_generation(sender, **kwargs):
+    """Drops cached anonymous recipe responses,
+    tags and ingredients are saved in the same transaction."""
+    transaction.on_commit(bump_recipes_generation)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def bump_shopping_cart_files(sender, raw=False, created=False, **kwargs):
+    """Shopping cart files show ingredient names and units
+    and totals of recipes in carts."""
+    if not raw and not created:
+        transaction.on_commit(bump_recipes_version)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search(sender, instance, raw, update_fields, **kwargs):
+    """Recipes saved anywhere (admin, shell, serializers) get search
+    vector, saves of other fields only are skipped."""
+    if raw or update_fields is not None and not (
+            {'name', 'text'} & set(update_fields)):
+        return
+    update_search_vectors([instance.id])
+
+
+@receiver(post_save, sender=IngredientToRecipe)
+def update_recipe_ingredients_search(sender, instance, raw, **kwargs):
+    """bulk_create, bulk_update and queryset delete of ingredient rows
+    send no signals, their callers update search vectors themselves."""
+    if not raw:
+        update_search_vectors([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_recipes_search(sender, instance, created, raw, **kwargs):
+    """Renamed ingredient changes search vectors of its recipes."""
+    if not created and not raw:
+        update_search_vectors(
+            Recipe.objects.filter(ingredient__ingredient=instance)
+            .values('id'))
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_from_cart_totals(sender, instance, **kwargs):
+    """Shopping cart rows of recipe are deleted by cascade,
+    its ingredients are subtracted from cart totals before."""
+    remove_recipe_from_carts(instance.id)
@@ -0,0 +1,1115 @@
+import base64
+import io
+import json
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import F
+from django.db.migrations.executor import MigrationExecutor
+from django.test import (SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import (APIClient, APITestCase,
+                                 APITransactionTestCase)
+from foodgram.cart import get_cart_totals, get_stored_cart_totals
+from foodgram.catalog import Catalog, catalog
+from foodgram.checks import check_shared_caches
+from foodgram.images import ImageDecodeError, decode_base64_image
+from foodgram.models import (Favorite, Ingredient, IngredientToRecipe,
+                             Recipe, ShoppingCart, Tag)
+from foodgram.renderers import TxtShoppingCartRenderer
+from foodgram.serializers import TagSerializer
+from foodgram.trending import TRENDING_LOCK_KEY, update_trending_scores
+from foodgram_backend.metrics import assert_query_budget, timed_serializer
+from foodgram_backend.settings import (INGREDIENTS_SEARCH_LIMIT, QUERY_BUDGETS,
+                                       TRENDING_HALF_LIFE)
+from users.models import Subscription, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_base64():
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), 'red').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class FoodgramTestCase(APITestCase):
+    """Users, tags and ingredients shared by tests, clean caches
+    and catalog for every test."""
+    ingredients_count = 100
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{number}@example.com',
+                username=f'user{number}', first_name='First',
+                last_name='Last', password='password-12345')
+            for number in range(3)
+        ]
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f'tag{number}', slug=f'tag{number}', color='#000000')
+            for number in range(3))
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ingredient{number}', measurement_unit='g')
+            for number in range(cls.ingredients_count))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        catalog.bump_version(Tag)
+        catalog.bump_version(Ingredient)
+
+    def authenticate(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    @classmethod
+    def create_recipe(cls, author, ingredients=3, name='recipe'):
+        recipe = Recipe.objects.create(
+            author=author, name=name, text='text', cooking_time=5,
+            image='recipes/images/recipe.png')
+        recipe.tags.set(cls.tags[:2])
+        IngredientToRecipe.objects.bulk_create(
+            IngredientToRecipe(recipe=recipe, ingredient=ingredient,
+                               amount=number + 1)
+            for number, ingredient in enumerate(
+                cls.ingredients[:ingredients]))
+        return recipe
+
+
+class RecipeReadQueriesTest(FoodgramTestCase):
+    """List and retrieve make the same amount of queries
+    for any page size and any amount of tags and ingredients."""
+    def test_list(self):
+        for number in range(100):
+            self.create_recipe(self.users[number % 2], name=f'r{number}')
+        self.authenticate(self.users[2])
+        self.client.get('/api/recipes/')
+
+        for limit in (1, 6, 100):
+            with self.subTest(limit=limit), self.assertNumQueries(5):
+                response = self.client.get(
+                    '/api/recipes/', {'limit': limit})
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_retrieve(self):
+        self.authenticate(self.users[2])
+        recipe = self.create_recipe(self.users[0])
+        self.client.get(f'/api/recipes/{recipe.id}/')
+
+        for ingredients in (1, 6, 100):
+            recipe = self.create_recipe(
+                self.users[0], ingredients, name=f'r{ingredients}')
+            with self.subTest(ingredients=ingredients), \
+                    self.assertNumQueries(5):
+                response = self.client.get(f'/api/recipes/{recipe.id}/')
+            self.assertEqual(len(response.data['ingredients']), ingredients)
+
+
+class CatalogTest(FoodgramTestCase):
+    """Warm catalog reads don't query database."""
+    def test_warm_reads(self):
+        tag, ingredient = self.tags[0], self.ingredients[0]
+        for url in ('/api/tags/', f'/api/tags/{tag.id}/',
+                    '/api/ingredients/', f'/api/ingredients/{ingredient.id}/'):
+            self.client.get(url)
+            with self.subTest(url=url), self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog.get(Tag, tag.id), tag)
+            self.assertEqual(
+                list(catalog.in_bulk(Ingredient, [ingredient.id])),
+                [ingredient.id])
+            self.assertEqual(len(catalog.all(Tag)), len(self.tags))
+
+    def test_shared_cache(self):
+        """Other worker with empty memory loads tables from shared cache."""
+        catalog.all(Tag)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(Catalog().all(Tag)), len(self.tags))
+
+    def test_change_bumps_version(self):
+        tag = self.tags[0]
+        version = catalog.version(Tag)
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.name = 'renamed'
+            tag.save()
+
+        self.assertNotEqual(catalog.version(Tag), version)
+        self.assertEqual(catalog.get(Tag, tag.id).name, 'renamed')
+
+
+class RecipeWriteQueriesTest(FoodgramTestCase):
+    """Create and update make the same amount of queries
+    for any amount of ingredients."""
+    ingredients_count = 200
+    # Search vector UPDATE statements are made on PostgreSQL only.
+    search_updates = 1 if connection.vendor == 'postgresql' else 0
+
+    def recipe_data(self, name, ingredients, tags):
+        return {
+            'name': name, 'text': 'text', 'cooking_time': 5,
+            'image': image_base64(),
+            'tags': [tag.id for tag in tags],
+            'ingredients': [{'id': ingredient.id, 'amount': 2}
+                            for ingredient in ingredients],
+        }
+
+    def test_create(self):
+        self.authenticate(self.users[0])
+        self.client.post('/api/recipes/', self.recipe_data(
+            'warm-up', self.ingredients[:1], self.tags[:1]), format='json')
+
+        for ingredients in (1, 10, 100):
+            data = self.recipe_data(
+                f'r{ingredients}', self.ingredients[:ingredients], self.tags)
+            with self.subTest(ingredients=ingredients), \
+                    self.assertNumQueries(11 + 2 * self.search_updates):
+                response = self.client.post(
+                    '/api/recipes/', data, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(response.data['ingredients']), ingredients)
+
+    def test_update(self):
+        """All ingredients and tags are replaced."""
+        self.authenticate(self.users[0])
+        warm_up = self.create_recipe(self.users[0], 1, name='warm-up')
+        self.client.put(f'/api/recipes/{warm_up.id}/', self.recipe_data(
+            'warm-up', self.ingredients[1:2], self.tags[2:]), format='json')
+
+        for ingredients in (1, 10, 100):
+            recipe = self.create_recipe(
+                self.users[0], ingredients, name=f'r{ingredients}')
+            data = self.recipe_data(
+                f'r{ingredients}', self.ingredients[100:100 + ingredients],
+                self.tags[2:])
+            with self.subTest(ingredients=ingredients), \
+                    self.assertNumQueries(19 + self.search_updates):
+                response = self.client.put(
+                    f'/api/recipes/{recipe.id}/', data, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['ingredients']), ingredients)
+
+
+class LoadIngredientsTest(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def load(self, name, content, **options):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        stdout = io.StringIO()
+        call_command('load_ingredients', str(path), stdout=stdout,
+                     **options)
+        return stdout.getvalue()
+
+    def ingredients(self):
+        return sorted(Ingredient.objects.values_list(
+            'name', 'measurement_unit'))
+
+    def test_csv(self):
+        content = ('salt,g\n'
+                   'sugar, kg \n'
+                   '\n'
+                   'broken\n'
+                   'milk,ml,extra\n'
+                   ',g\n')
+        output = self.load('ingredients.csv', content)
+        self.assertEqual(self.ingredients(),
+                         [('salt', 'g'), ('sugar', 'kg')])
+        self.assertIn('Processed 5 rows, inserted 2, skipped invalid 3',
+                      output)
+        self.assertIn('Invalid lines: 4, 5, 6.', output)
+
+        output = self.load('ingredients.csv', content)
+        self.assertIn('inserted 0', output)
+        self.assertEqual(len(self.ingredients()), 2)
+
+    @patch('foodgram.management.commands.load_ingredients.READ_SIZE', 7)
+    def test_json(self):
+        """Objects are decoded across read chunks."""
+        output = self.load('ingredients.json', json.dumps([
+            {'name': 'salt', 'measurement_unit': 'g'},
+            {'name': 'sugar'},
+            'broken',
+            {'name': 'молоко', 'measurement_unit': 'мл'},
+        ], ensure_ascii=False), format='json')
+        self.assertEqual(self.ingredients(),
+                         [('salt', 'g'), ('молоко', 'мл')])
+        self.assertIn('Invalid items: 2, 3.', output)
+
+    def test_not_array(self):
+        with self.assertRaises(CommandError):
+            self.load('ingredients.json', '{"name": "salt"}')
+
+
+class RecipeUpdateTest(FoodgramTestCase):
+    """Updates apply only changed ingredients and tags, shopping cart
+    totals of users with recipe follow them."""
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe(self.users[0])
+        self.authenticate(self.users[1])
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.authenticate(self.users[0])
+
+    def patch(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def amounts(self):
+        return dict(IngredientToRecipe.objects.filter(
+            recipe=self.recipe).values_list('ingredient', 'amount'))
+
+    def totals(self):
+        user_ids = [self.users[1].id]
+        totals = get_stored_cart_totals(user_ids)
+        self.assertEqual(totals, get_cart_totals(user_ids))
+        return {ingredient_id: total for (_, ingredient_id), total
+                in totals.items()}
+
+    def test_without_ingredients(self):
+        amounts, totals = self.amounts(), self.totals()
+        self.patch({'name': 'renamed'})
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'renamed')
+        self.assertEqual(self.amounts(), amounts)
+        self.assertEqual(self.totals(), totals)
+        self.assertEqual(set(self.recipe.tags.all()), set(self.tags[:2]))
+
+    def test_ingredients(self):
+        """First amount changed, second kept, third removed,
+        fourth added."""
+        first, second, third, fourth = self.ingredients[:4]
+        url = '/api/recipes/download_shopping_cart/'
+        self.authenticate(self.users[1])
+        b''.join(self.client.get(url).streaming_content)
+        self.authenticate(self.users[0])
+        self.patch({'ingredients': [
+            {'id': first.id, 'amount': 10}, {'id': second.id, 'amount': 2},
+            {'id': fourth.id, 'amount': 4}]})
+        self.assertEqual(self.amounts(),
+                         {first.id: 10, second.id: 2, fourth.id: 4})
+        self.assertEqual(self.totals(), {
+            first.id: (10, 1), second.id: (2, 1), fourth.id: (4, 1)})
+
+        self.authenticate(self.users[1])
+        content = b''.join(self.client.get(url).streaming_content).decode()
+        self.assertIn(f'{first.name} - 10 g.', content)
+        self.assertNotIn(third.name, content)
+
+    def test_tags(self):
+        self.patch({'tags': [self.tags[1].id, self.tags[2].id]})
+        self.assertEqual(set(self.recipe.tags.all()), set(self.tags[1:]))
+
+
+class BatchTest(FoodgramTestCase):
+    """Statuses of every id and counters of batch endpoints."""
+    missing_id = 10 ** 9
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = [self.create_recipe(self.users[0], name=f'r{number}')
+                        for number in range(3)]
+        self.authenticate(self.users[1])
+
+    def send(self, method, url, ids):
+        response = getattr(self.client, method)(url, {'ids': ids},
+                                                format='json')
+        self.assertEqual(response.status_code, 200)
+        return [(result['id'], result['status'])
+                for result in response.data['results']]
+
+    def counters(self, field):
+        return list(Recipe.objects.filter(
+            id__in=[recipe.id for recipe in self.recipes]
+        ).order_by('id').values_list(field, flat=True))
+
+    def test_favorite(self):
+        url = '/api/recipes/favorite/'
+        first, second, third = (recipe.id for recipe in self.recipes)
+        self.send('post', url, [first])
+        self.assertEqual(
+            self.send('post', url, [first, second, self.missing_id, second]),
+            [(first, 'already_added'), (second, 'added'),
+             (self.missing_id, 'not_found')])
+        self.assertEqual(self.counters('favorites_count'), [1, 1, 0])
+
+        self.assertEqual(
+            self.send('delete', url, [first, third, self.missing_id]),
+            [(first, 'removed'), (third, 'not_added'),
+             (self.missing_id, 'not_found')])
+        self.assertEqual(self.counters('favorites_count'), [0, 1, 0])
+        self.assertEqual(
+            list(Favorite.objects.values_list('user', 'recipe')),
+            [(self.users[1].id, second)])
+
+    def test_shopping_cart(self):
+        url = '/api/recipes/shopping_cart/'
+        ids = [recipe.id for recipe in self.recipes]
+        self.assertEqual(self.send('post', url, ids),
+                         [(pk, 'added') for pk in ids])
+        self.assertEqual(self.counters('shopping_carts_count'), [1, 1, 1])
+        self.assertEqual(self.send('delete', url, ids[:1]),
+                         [(ids[0], 'removed')])
+        self.assertEqual(self.counters('shopping_carts_count'), [0, 1, 1])
+
+        user_ids = [self.users[1].id]
+        self.assertEqual(get_stored_cart_totals(user_ids),
+                         get_cart_totals(user_ids))
+        self.assertEqual(get_stored_cart_totals(user_ids)[
+            (self.users[1].id, self.ingredients[0].id)], (2, 2))
+
+    def test_subscribe(self):
+        url = '/api/users/subscribe/'
+        author, user = self.users[0], self.users[1]
+        self.assertEqual(
+            self.send('post', url, [author.id, user.id, self.missing_id]),
+            [(author.id, 'added'), (user.id, 'forbidden'),
+             (self.missing_id, 'not_found')])
+        author.refresh_from_db()
+        self.assertEqual(author.subscribers_count, 1)
+
+        self.assertEqual(self.send('delete', url, [author.id, author.id]),
+                         [(author.id, 'removed')])
+        author.refresh_from_db()
+        self.assertEqual(author.subscribers_count, 0)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_invalid(self):
+        response = self.client.post('/api/recipes/favorite/',
+                                    {'ids': 'first'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SubscriptionsTest(FoodgramTestCase):
+    def test_recipes_limit(self):
+        """Latest recipes_limit recipes of every author."""
+        recipes = {
+            author.id: [self.create_recipe(author, name=f'{author.id}-{n}')
+                        for n in range(count)]
+            for author, count in ((self.users[0], 5), (self.users[1], 2))
+        }
+        Subscription.objects.bulk_create(
+            Subscription(user=self.users[2], author=author)
+            for author in self.users[:2])
+        self.authenticate(self.users[2])
+
+        response = self.client.get('/api/users/subscriptions/',
+                                   {'recipes_limit': 3})
+        self.assertEqual(
+            {author['id']: [recipe['id'] for recipe in author['recipes']]
+             for author in response.data['results']},
+            {author_id: [recipe.id for recipe in reversed(author_recipes)][:3]
+             for author_id, author_recipes in recipes.items()})
+        self.assertTrue(all(author['is_subscribed']
+                            for author in response.data['results']))
+
+
+class CountersTest(FoodgramTestCase):
+    def test_api(self):
+        recipe = self.create_recipe(self.users[0])
+        self.authenticate(self.users[1])
+        for method, expected in (('post', 1), ('delete', 0)):
+            getattr(self.client, method)(
+                f'/api/recipes/{recipe.id}/favorite/')
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.favorites_count, expected)
+
+        self.client.post(f'/api/users/{self.users[0].id}/subscribe/')
+        self.users[0].refresh_from_db()
+        self.assertEqual(self.users[0].subscribers_count, 1)
+
+    def test_recount(self):
+        recipe = self.create_recipe(self.users[0])
+        Favorite.objects.create(user=self.users[1], recipe=recipe)
+        ShoppingCart.objects.create(user=self.users[2], recipe=recipe)
+        Subscription.objects.create(user=self.users[1], author=self.users[0])
+        Recipe.objects.update(favorites_count=7, shopping_carts_count=0)
+
+        call_command('recount', batch_size=1, stdout=io.StringIO())
+        recipe.refresh_from_db()
+        author = User.objects.get(id=self.users[0].id)
+        self.assertEqual(
+            (recipe.favorites_count, recipe.shopping_carts_count,
+             author.recipes_count, author.subscribers_count),
+            (1, 1, 1, 1))
+
+
+class RecipeTagsFilterTest(FoodgramTestCase):
+    def test_any_tag(self):
+        """Recipes with any of tags, each of them once."""
+        both = self.create_recipe(self.users[0], name='both')
+        first = self.create_recipe(self.users[0], name='first')
+        first.tags.set(self.tags[:1])
+        other = self.create_recipe(self.users[0], name='other')
+        other.tags.set(self.tags[2:])
+
+        response = self.client.get('/api/recipes/', {
+            'tags': [self.tags[0].slug, self.tags[1].slug]})
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [first.id, both.id])
+        response = self.client.get('/api/recipes/', {'tags': 'unknown'})
+        self.assertEqual(response.data['results'], [])
+
+
+class AnonymousCacheTest(FoodgramTestCase):
+    def test_hit_and_invalidation(self):
+        recipe = self.create_recipe(self.users[0])
+        url = f'/api/recipes/{recipe.id}/'
+        for expected in ('MISS', 'HIT'):
+            response = self.client.get(url)
+            self.assertEqual(response['X-Cache'], expected)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.name = 'renamed'
+            recipe.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['name'], 'renamed')
+
+    def test_authenticated(self):
+        self.create_recipe(self.users[0])
+        self.authenticate(self.users[1])
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('X-Cache'))
+
+
+class DecodeBase64ImageTest(SimpleTestCase):
+    def test_whitespace(self):
+        """Line breaks don't shift decoded chunks."""
+        header, encoded = image_base64().split(',', 1)
+        wrapped = '\n'.join(
+            encoded[start:start + 7] for start in range(0, len(encoded), 7))
+        with patch('foodgram.images.BASE64_CHUNK_SIZE', 8):
+            file = decode_base64_image(f'{header},\n {wrapped}\n')
+        with Image.open(file) as image:
+            self.assertEqual(image.size, (40, 30))
+
+    def test_invalid_characters(self):
+        header, encoded = image_base64().split(',', 1)
+        with self.assertRaises(ImageDecodeError):
+            decode_base64_image(f'{header},{encoded[:8]}*{encoded[8:]}')
+
+
+class RecipeCursorPaginationTest(FoodgramTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipes = [
+            cls.create_recipe(cls.users[0], name=f'r{number}')
+            for number in range(7)]
+
+    def test_walk(self):
+        """Next links go through all recipes from the newest one."""
+        ids, url = [], '/api/recipes/?cursor=&limit=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(
+            ids, [recipe.id for recipe in reversed(self.recipes)])
+
+    def test_other_ordering(self):
+        response = self.client.get(
+            '/api/recipes/', {'cursor': '', 'ordering': 'popular'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.data)
+
+
+class IngredientSearchTest(FoodgramTestCase):
+    def search(self, **params):
+        response = self.client.get('/api/ingredients/', params)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_prefix_first(self):
+        for name in ('sea salt', 'Salted butter', 'salt'):
+            Ingredient.objects.create(name=name, measurement_unit='g')
+        catalog.bump_version(Ingredient)
+        self.assertEqual(self.search(name=' SALT'),
+                         ['salt', 'Salted butter', 'sea salt'])
+
+    def test_limit(self):
+        names = sorted(ingredient.name for ingredient in self.ingredients)
+        self.assertEqual(self.search(name='ingr'),
+                         names[:INGREDIENTS_SEARCH_LIMIT])
+        self.assertEqual(self.search(name='ingr', limit=1000),
+                         names[:INGREDIENTS_SEARCH_LIMIT])
+        self.assertEqual(self.search(name='ingr', limit=3), names[:3])
+        self.assertEqual(len(self.search(name='gredient')),
+                         INGREDIENTS_SEARCH_LIMIT)
+
+
+class RecipeSearchTest(FoodgramTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipes = [
+            cls.create_recipe(cls.users[0], name=f'soup {number}')
+            for number in range(5)]
+        cls.create_recipe(cls.users[0], name='salad')
+
+    def test_matches(self):
+        response = self.client.get('/api/recipes/', {'search': 'soup'})
+        self.assertEqual(response.data['count'], 5)
+
+    def test_saved_outside_api(self):
+        """Recipes and ingredient rows saved by ORM or admin are found."""
+        recipe = Recipe.objects.create(
+            author=self.users[1], name='stew', text='text', cooking_time=5,
+            image='recipes/images/recipe.png')
+        IngredientToRecipe.objects.create(
+            recipe=recipe, ingredient=self.ingredients[50], amount=1)
+        for search in ('stew', 'ingredient50'):
+            response = self.client.get('/api/recipes/', {'search': search})
+            with self.subTest(search=search):
+                self.assertEqual(
+                    [recipe['id'] for recipe in response.data['results']],
+                    [recipe.id])
+
+    @patch('foodgram.search.RECIPE_SEARCH_FALLBACK_LIMIT', 3)
+    def test_fallback_limit(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('Limit is used only without PostgreSQL.')
+        response = self.client.get('/api/recipes/', {'search': 'soup'})
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [recipe.id for recipe in reversed(self.recipes[2:])])
+
+    def test_cursor(self):
+        """Cursor can't keep rank ordering."""
+        response = self.client.get(
+            '/api/recipes/', {'search': 'soup', 'cursor': ''})
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipeByIngredientsTest(FoodgramTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.full = cls.create_recipe(cls.users[0], 2, name='full')
+        cls.half = cls.create_recipe(cls.users[0], 4, name='half')
+
+    def test_coverage_order(self):
+        response = self.client.get(
+            '/api/recipes/by_ingredients/',
+            {'ingredients': [ingredient.id
+                             for ingredient in self.ingredients[:2]]})
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.full.id, self.half.id])
+
+    def test_cursor(self):
+        response = self.client.get(
+            '/api/recipes/by_ingredients/',
+            {'ingredients': self.ingredients[0].id, 'cursor': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.data)
+
+
+class TrendingTest(FoodgramTestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipes = [self.create_recipe(self.users[0], name=f'r{number}')
+                        for number in range(3)]
+
+    def add(self, recipe, favorites=0, shopping_carts=0):
+        Recipe.objects.filter(id=recipe.id).update(
+            favorites_count=F('favorites_count') + favorites,
+            shopping_carts_count=F('shopping_carts_count') + shopping_carts)
+
+    def scores(self):
+        return [Recipe.objects.get(id=recipe.id).trending_score
+                for recipe in self.recipes]
+
+    def test_decay(self):
+        now = timezone.now()
+        self.add(self.recipes[0], favorites=3, shopping_carts=1)
+        self.add(self.recipes[1], favorites=1)
+        self.assertEqual(update_trending_scores(now), 2)
+        self.assertEqual(self.scores(), [4, 1, 0])
+
+        now += timedelta(seconds=TRENDING_HALF_LIFE)
+        self.add(self.recipes[2], shopping_carts=2)
+        self.assertEqual(update_trending_scores(now), 3)
+        self.assertEqual(self.scores(), [2, 0.5, 2])
+
+        now += timedelta(seconds=TRENDING_HALF_LIFE * 10)
+        update_trending_scores(now)
+        recipe = Recipe.objects.get(id=self.recipes[1].id)
+        self.assertEqual(recipe.trending_score, 0)
+        self.assertIsNone(recipe.trending_updated_at)
+
+    def test_locked(self):
+        """Run overlapping with other one is skipped."""
+        if connection.vendor != 'postgresql':
+            self.skipTest('Advisory locks are used only on PostgreSQL.')
+        other = connections.create_connection('default')
+        try:
+            with other.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_lock(%s)',
+                               [TRENDING_LOCK_KEY])
+                self.add(self.recipes[0], favorites=1)
+                self.assertIsNone(update_trending_scores())
+                cursor.execute('SELECT pg_advisory_unlock(%s)',
+                               [TRENDING_LOCK_KEY])
+        finally:
+            other.close()
+        self.assertEqual(update_trending_scores(), 1)
+
+    def test_orderings(self):
+        self.add(self.recipes[0], favorites=1, shopping_carts=5)
+        self.add(self.recipes[1], favorites=3)
+        update_trending_scores()
+        for ordering, expected in (('popular', [1, 0, 2]),
+                                   ('trending', [0, 1, 2])):
+            response = self.client.get('/api/recipes/',
+                                       {'ordering': ordering})
+            with self.subTest(ordering=ordering):
+                self.assertEqual(
+                    [recipe['id'] for recipe in response.data['results']],
+                    [self.recipes[index].id for index in expected])
+
+
+class RecipeConditionalGetTest(FoodgramTestCase):
+    def test_relation_change(self):
+        """Favorite changes ETag, If-Modified-Since alone isn't trusted."""
+        recipe = self.create_recipe(self.users[0])
+        url = f'/api/recipes/{recipe.id}/'
+        self.authenticate(self.users[1])
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'{url}favorite/')
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=etag,
+            HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DownloadShoppingCartTest(FoodgramTestCase):
+    url = '/api/recipes/download_shopping_cart/'
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe(self.users[0])
+        self.authenticate(self.users[1])
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_txt(self):
+        response, content = self.download()
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename=shopping_cart.txt')
+        self.assertEqual(content.splitlines(), [
+            TxtShoppingCartRenderer.title, 'ingredient0 - 1 g.',
+            'ingredient1 - 2 g.', 'ingredient2 - 3 g.'])
+
+    def test_csv(self):
+        response, content = self.download(format='csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertEqual(content.splitlines(), [
+            'name,amount,measurement_unit', 'ingredient0,1,g',
+            'ingredient1,2,g', 'ingredient2,3,g'])
+
+    def test_pdf(self):
+        response = self.client.get(self.url, {'format': 'pdf'})
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename=shopping_cart.pdf')
+        self.assertTrue(
+            b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_accept_fallback(self):
+        """API clients accepting only JSON get txt file."""
+        response = self.client.get(self.url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertEqual(
+            self.client.get(self.url, {'format': 'xml'}).status_code, 404)
+
+    def test_cached(self):
+        self.download()
+        with self.assertNumQueries(1):
+            self.download()
+
+    def test_ingredient_change(self):
+        self.download()
+        ingredient = self.ingredients[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.name = 'renamed'
+            ingredient.measurement_unit = 'kg'
+            ingredient.save()
+        self.assertIn('renamed - 1 kg.', self.download()[1])
+
+    def test_recipe_delete(self):
+        """Recipes deleted outside API (admin) leave carts too."""
+        self.download()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        self.assertEqual(self.download()[1], TxtShoppingCartRenderer.title)
+
+
+class ConcurrentTogglesTest(APITransactionTestCase):
+    """Concurrent adding to favorite, shopping cart and subscriptions
+    makes one row and keeps counters and cart totals right."""
+    requests_count = 8
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='First', last_name='Last', password='password-12345')
+        self.users = [
+            User.objects.create_user(
+                email=f'user{number}@example.com',
+                username=f'user{number}', first_name='First',
+                last_name='Last', password='password-12345')
+            for number in range(2)
+        ]
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='recipe', text='text', cooking_time=5,
+            image='recipes/images/recipe.png')
+        IngredientToRecipe.objects.bulk_create(
+            IngredientToRecipe(recipe=self.recipe, ingredient=ingredient,
+                               amount=number + 1)
+            for number, ingredient in enumerate(
+                Ingredient.objects.bulk_create(
+                    Ingredient(name=f'ingredient{number}',
+                               measurement_unit='g')
+                    for number in range(3))))
+
+    def post(self, user, url):
+        """Status of request. Exceptions are caught by signal shared with
+        clients in other threads, so errors are taken as 500 responses."""
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(user)
+        try:
+            return client.post(url).status_code
+        finally:
+            connection.close()
+
+    def test_concurrent_posts(self):
+        urls = (f'/api/recipes/{self.recipe.id}/favorite/',
+                f'/api/recipes/{self.recipe.id}/shopping_cart/',
+                f'/api/users/{self.author.id}/subscribe/')
+        requests = [(user, url) for user in self.users for url in urls
+                    for _ in range(self.requests_count)]
+        with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+            statuses = list(executor.map(
+                lambda request: self.post(*request), requests))
+
+        for user in self.users:
+            for url, model, filters in (
+                    (urls[0], Favorite, {'recipe': self.recipe}),
+                    (urls[1], ShoppingCart, {'recipe': self.recipe}),
+                    (urls[2], Subscription, {'author': self.author})):
+                with self.subTest(user=user.username, url=url):
+                    created = sum(
+                        status == 201 for (request_user, request_url), status
+                        in zip(requests, statuses)
+                        if (request_user, request_url) == (user, url))
+                    rows = model.objects.filter(user=user, **filters).count()
+                    self.assertLessEqual(rows, 1)
+                    self.assertEqual(created, rows)
+
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count,
+                         Favorite.objects.count())
+        self.assertEqual(self.recipe.shopping_carts_count,
+                         ShoppingCart.objects.count())
+        self.assertEqual(self.author.subscribers_count,
+                         Subscription.objects.count())
+        user_ids = [user.id for user in self.users]
+        self.assertEqual(get_stored_cart_totals(user_ids),
+                         get_cart_totals(user_ids))
+        # SQLite refuses writes to locked tables, PostgreSQL waits.
+        if connection.vendor == 'postgresql':
+            self.assertNotIn(500, statuses)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class QueryBudgetTest(APITransactionTestCase):
+    """Every endpoint of QUERY_BUDGETS fits its budget with cold
+    catalog, user relations and recipe caches. Streamed content
+    is consumed to count its queries."""
+    def setUp(self):
+        cache.clear()
+        self.author, self.user = (
+            User.objects.create_user(
+                email=f'{name}@example.com', username=name,
+                first_name='First', last_name='Last',
+                password='password-12345')
+            for name in ('author', 'user'))
+        self.tags = Tag.objects.bulk_create(
+            Tag(name=f'tag{number}', slug=f'tag{number}', color='#000000')
+            for number in range(2))
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ingredient{number}', measurement_unit='g')
+            for number in range(6))
+        self.recipes = []
+        for number in range(3):
+            recipe = Recipe.objects.create(
+                author=self.author, name=f'recipe{number}', text='text',
+                cooking_time=5, image='recipes/images/recipe.png')
+            recipe.tags.set(self.tags)
+            IngredientToRecipe.objects.bulk_create(
+                IngredientToRecipe(recipe=recipe, ingredient=ingredient,
+                                   amount=2)
+                for ingredient in self.ingredients[number:number + 3])
+            self.recipes.append(recipe)
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def recipe_data(self, name, ingredients, tags):
+        return {
+            'name': name, 'text': 'text', 'cooking_time': 5,
+            'image': image_base64(),
+            'tags': [tag.id for tag in tags],
+            'ingredients': [{'id': ingredient.id, 'amount': 2}
+                            for ingredient in ingredients],
+        }
+
+    @patch('foodgram_backend.metrics.QUERY_BUDGETS_RAISE', True)
+    def test_budgets(self):
+        recipe, author = self.recipes[0], self.author
+        recipe_ids = {'ids': [recipe.id for recipe in self.recipes]}
+        created = Recipe.objects.create(
+            author=self.user, name='created', text='text', cooking_time=5,
+            image='recipes/images/recipe.png')
+        requests = (
+            ('get', '/api/tags/', None),
+            ('get', f'/api/tags/{self.tags[0].id}/', None),
+            ('get', '/api/ingredients/?name=ingr', None),
+            ('get', f'/api/ingredients/{self.ingredients[0].id}/', None),
+            ('get', '/api/recipes/', None),
+            ('get', f'/api/recipes/{recipe.id}/', None),
+            ('get', '/api/recipes/by_ingredients/'
+                    f'?ingredients={self.ingredients[0].id}', None),
+            ('post', '/api/recipes/',
+             self.recipe_data('new', self.ingredients[:3], self.tags)),
+            ('patch', f'/api/recipes/{created.id}/', self.recipe_data(
+                'patched', self.ingredients[:3], self.tags[:1])),
+            ('put', f'/api/recipes/{created.id}/', self.recipe_data(
+                'put', self.ingredients[3:], self.tags[1:])),
+            ('post', f'/api/recipes/{recipe.id}/favorite/', None),
+            ('post', f'/api/recipes/{recipe.id}/shopping_cart/', None),
+            ('post', '/api/recipes/favorite/', recipe_ids),
+            ('post', '/api/recipes/shopping_cart/', recipe_ids),
+            ('get', '/api/recipes/download_shopping_cart/', None),
+            ('delete', f'/api/recipes/{recipe.id}/favorite/', None),
+            ('delete', f'/api/recipes/{recipe.id}/shopping_cart/', None),
+            ('delete', '/api/recipes/favorite/', recipe_ids),
+            ('delete', '/api/recipes/shopping_cart/', recipe_ids),
+            ('post', f'/api/users/{author.id}/subscribe/', None),
+            ('get', '/api/users/subscriptions/', None),
+            ('delete', f'/api/users/{author.id}/subscribe/', None),
+            ('post', '/api/users/subscribe/', {'ids': [author.id]}),
+            ('delete', '/api/users/subscribe/', {'ids': [author.id]}),
+        )
+        endpoints = set()
+        for method, url, data in requests:
+            cache.clear()
+            catalog.bump_version(Tag)
+            catalog.bump_version(Ingredient)
+            response = getattr(self.client, method)(url, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            with self.subTest(method=method, url=url):
+                self.assertLess(response.status_code, 300)
+                assert_query_budget(response)
+            endpoints.add(response.metrics.endpoint)
+
+        self.assertEqual(endpoints, set(QUERY_BUDGETS))
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    def check(self, backend):
+        with patch.dict('foodgram.checks.CACHES',
+                        {'default': {'BACKEND': backend}}):
+            return [error.id for error in check_shared_caches(None)]
+
+    def test_process_local(self):
+        self.assertEqual(
+            self.check('django.core.cache.backends.locmem.LocMemCache'),
+            ['foodgram.E001'])
+
+    def test_shared(self):
+        self.assertEqual(
+            self.check('django.core.cache.backends.redis.RedisCache'), [])
+
+
+class MetricsViewTest(SimpleTestCase):
+    def test_token(self):
+        with patch('foodgram_backend.metrics.METRICS_TOKEN', 'secret'):
+            self.assertEqual(self.client.get('/api/_metrics').status_code,
+                             403)
+            response = self.client.get(
+                '/api/_metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_no_token(self):
+        """Without token metrics are open only in DEBUG."""
+        self.assertEqual(self.client.get('/api/_metrics').status_code, 403)
+        with patch('foodgram_backend.metrics.DEBUG', True):
+            self.assertEqual(self.client.get('/api/_metrics').status_code,
+                             200)
+
+
+class SerializerTimingTest(APITestCase):
+    def test_list(self):
+        Tag.objects.create(name='tag', slug='tag', color='#000000')
+        catalog.bump_version(Tag)
+        response = self.client.get('/api/tags/')
+        self.assertEqual(response.data[0]['slug'], 'tag')
+        self.assertGreater(response.metrics.serializer_time, 0)
+        self.assertIn('serializer;dur=', response['Server-Timing'])
+
+    def test_not_global(self):
+        """Serializers made outside timed views are left as they are."""
+        self.assertIs(type(TagSerializer()), TagSerializer)
+        self.assertEqual(timed_serializer(TagSerializer).__name__,
+                         'TagSerializer')
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Migrate database back to migrate_from, fill it by
+    before_migration(apps) with historical models and migrate
+    to migrate_to, self.apps are models after migration."""
+    migrate_from = migrate_to = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.before_migration(
+            executor.loader.project_state(self.migrate_from).apps)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        self.apps = executor.loader.project_state(self.migrate_to).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def before_migration(self, apps):
+        pass
+
+
+class ShoppingCartRowsMigrationTest(MigrationTestCase):
+    """Old carts (one row per user with recipes m2m) become
+    one row per user and recipe."""
+    migrate_from = [('foodgram', '0028_shoppingcartingredient')]
+    migrate_to = [('foodgram', '0031_shoppingcart_recipe_required')]
+
+    def before_migration(self, apps):
+        User = apps.get_model('users', 'User')
+        Recipe = apps.get_model('foodgram', 'Recipe')
+        ShoppingCart = apps.get_model('foodgram', 'ShoppingCart')
+        users = [User.objects.create(email=f'user{number}@example.com',
+                                     username=f'user{number}')
+                 for number in range(2)]
+        recipes = [Recipe.objects.create(
+            author=users[0], name=f'recipe{number}', text='text',
+            cooking_time=5, image='recipes/images/recipe.png')
+            for number in range(3)]
+        ShoppingCart.objects.create(user=users[0]).recipes.set(recipes)
+        ShoppingCart.objects.create(user=users[1]).recipes.set(recipes[1:])
+        self.expected = {(users[0].id, recipe.id) for recipe in recipes} | {
+            (users[1].id, recipe.id) for recipe in recipes[1:]}
+
+    def test_rows(self):
+        ShoppingCart = self.apps.get_model('foodgram', 'ShoppingCart')
+        self.assertEqual(
+            set(ShoppingCart.objects.values_list('user', 'recipe')),
+            self.expected)
+
+
+class MergeDuplicateIngredientsMigrationTest(MigrationTestCase):
+    """Duplicate ingredients are merged before unique constraint
+    is added, recipe amounts and cart totals are summed."""
+    migrate_from = [('foodgram', '0031_shoppingcart_recipe_required')]
+    migrate_to = [('foodgram', '0033_sync_model_state')]
+
+    def before_migration(self, apps):
+        User = apps.get_model('users', 'User')
+        Ingredient = apps.get_model('foodgram', 'Ingredient')
+        IngredientToRecipe = apps.get_model('foodgram', 'IngredientToRecipe')
+        Recipe = apps.get_model('foodgram', 'Recipe')
+        ShoppingCart = apps.get_model('foodgram', 'ShoppingCart')
+        ShoppingCartIngredient = apps.get_model(
+            'foodgram', 'ShoppingCartIngredient')
+        user = User.objects.create(email='user@example.com', username='user')
+        self.salt, duplicate = (
+            Ingredient.objects.create(name='salt', measurement_unit='g')
+            for _ in range(2))
+        both, one = (Recipe.objects.create(
+            author=user, name=name, text='text', cooking_time=5,
+            image='recipes/images/recipe.png') for name in ('both', 'one'))
+        IngredientToRecipe.objects.bulk_create((
+            IngredientToRecipe(recipe=both, ingredient=self.salt, amount=1),
+            IngredientToRecipe(recipe=both, ingredient=duplicate, amount=2),
+            IngredientToRecipe(recipe=one, ingredient=duplicate, amount=5),
+        ))
+        for recipe in (both, one):
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+        ShoppingCartIngredient.objects.bulk_create((
+            ShoppingCartIngredient(user=user, ingredient=self.salt,
+                                   total_amount=1, recipes_count=1),
+            ShoppingCartIngredient(user=user, ingredient=duplicate,
+                                   total_amount=7, recipes_count=2),
+        ))
+        self.user, self.both, self.one = user, both, one
+
+    def test_merged(self):
+        Ingredient = self.apps.get_model('foodgram', 'Ingredient')
+        IngredientToRecipe = self.apps.get_model(
+            'foodgram', 'IngredientToRecipe')
+        ShoppingCartIngredient = self.apps.get_model(
+            'foodgram', 'ShoppingCartIngredient')
+        self.assertEqual(list(Ingredient.objects.values_list('id', flat=True)),
+                         [self.salt.id])
+        self.assertEqual(
+            set(IngredientToRecipe.objects.values_list(
+                'recipe', 'ingredient', 'amount')),
+            {(self.both.id, self.salt.id, 3), (self.one.id, self.salt.id, 5)})
+        self.assertEqual(
+            list(ShoppingCartIngredient.objects.values_list(
+                'user', 'ingredient', 'total_amount', 'recipes_count')),
+            [(self.user.id, self.salt.id, 8, 2)])
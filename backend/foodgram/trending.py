@@ -0,0 +1,68 @@
+from django.db import connection, transaction
+from django.db.models import (Case, ExpressionWrapper, F, FloatField, Max, Q,
+                              Value, When)
+from django.db.models.functions import Greatest
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+from foodgram.models import Recipe
+from foodgram_backend.settings import TRENDING_HALF_LIFE, TRENDING_MIN_SCORE
+
+# PostgreSQL advisory lock key of update_trending_scores().
+TRENDING_LOCK_KEY = 7_215_371
+
+
+def _try_lock():
+    """Transaction level advisory lock, only PostgreSQL has them."""
+    if connection.vendor != 'postgresql':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_xact_lock(%s)',
+                       [TRENDING_LOCK_KEY])
+        return cursor.fetchone()[0]
+
+
+def update_trending_scores(now=None):
+    """Decay Recipe.trending_score by time passed since previous run and
+    add favorites and shopping carts added since then (growth of
+    favorites_count + shopping_carts_count over trending_base).
+
+    Only active recipes are touched: ones updated by previous run and
+    dormant (trending_updated_at is null) ones with new additions.
+    Scores decayed below TRENDING_MIN_SCORE become dormant.
+    Run by 'update_trending' command. On PostgreSQL overlapping runs
+    are skipped by advisory lock, so decay can't be applied twice.
+    Returns amount of updated recipes, None if run was skipped."""
+    with transaction.atomic():
+        if not _try_lock():
+            return None
+        return _update_scores(now or timezone.now())
+
+
+def _update_scores(now):
+    last = Recipe.objects.aggregate(
+        last=Max('trending_updated_at'))['last']
+
+    factor = 1.0
+    active = Q(pk__in=[])
+    if last is not None:
+        factor = 0.5 ** ((now - last).total_seconds() / TRENDING_HALF_LIFE)
+        active = Q(trending_updated_at=last)
+
+    total = F('favorites_count') + F('shopping_carts_count')
+    score = ExpressionWrapper(
+        F('trending_score') * factor
+        + Greatest(total - F('trending_base'), Value(0)),
+        output_field=FloatField(),
+    )
+    is_active = GreaterThanOrEqual(score, TRENDING_MIN_SCORE)
+
+    return Recipe.objects.filter(
+        active | (Q(trending_updated_at__isnull=True)
+                  & ~Q(trending_base=total))
+    ).update(
+        trending_score=Case(When(is_active, then=score),
+                            default=Value(0.0)),
+        trending_updated_at=Case(When(is_active, then=Value(now)),
+                                 default=Value(None)),
+        trending_base=total,
+    )
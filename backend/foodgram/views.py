@@ -1,21 +1,148 @@
-from django.db.models import Sum
-from django.http import HttpResponse
-from rest_framework import viewsets, mixins, permissions, status, filters
+import hashlib
+
+from django.db.models import Prefetch
+from django.db.transaction import atomic
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import viewsets, mixins, permissions, status
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from foodgram.models import (Tag, Ingredient, Recipe, Favorite, ShoppingCart,
-                             IngredientToRecipe)
+                             IngredientToRecipe, ShoppingCartIngredient)
 from foodgram.serializers import (TagSerializer, IngredientSerializer,
                                   RecipeSerializer, AddRecipeSerializer,
-                                  ShortRecipeSerializer)
-from foodgram.pagination import CustomWithLimitPagination
-from foodgram_backend.settings import FILE_NAME
-from foodgram.filters import RecipeFilter
-
-
-class TagViewSet(viewsets.GenericViewSet,
+                                  ShortRecipeSerializer,
+                                  RecipeMatchSerializer)
+from foodgram.pagination import RecipePagination
+from foodgram_backend.settings import FILE_NAME, SHOPPING_CART_CACHE_TIMEOUT
+from foodgram.cache import (bump_shopping_cart_version,
+                            get_shopping_cart_file_key,
+                            get_shopping_cart_file, cached_stream,
+                            AnonymousResponseCache)
+from foodgram.renderers import (SHOPPING_CART_RENDERERS,
+                                ShoppingCartContentNegotiation)
+from foodgram.catalog import catalog
+from foodgram.counters import change_counter
+from foodgram.db import insert_or_ignore
+from foodgram.cart import change_cart_totals
+from foodgram.batch import apply_batch
+from users.models import User
+from foodgram.filters import RecipeFilter, IngredientSearchFilter
+from foodgram.search import match_ingredients
+from foodgram.relations import get_user_relations, invalidate_user_relations
+from foodgram_backend.metrics import SerializerTimingMixin, timed_serializer
+
+
+class ConditionalGetMixin:
+    """Conditional GET for list and retrieve actions.
+
+    get_version_stamp() - returns (stamp, last_modified) of requested
+        resource built from version stamps without serialization, or None
+        when action doesn't support conditional requests.
+    Strong ETag is made from stamp, requests with matching If-None-Match
+    or If-Modified-Since get 304 Not Modified before serializer runs."""
+    vary_headers = ('Authorization',)
+
+    def get_version_stamp(self):
+        return None
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        version_stamp = self.get_version_stamp()
+        if version_stamp is None:
+            return handler(request, *args, **kwargs)
+
+        stamp, last_modified = version_stamp
+        etag = quote_etag(stamp)
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+
+        if response.status_code in (status.HTTP_200_OK,
+                                    status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, self.vary_headers)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
+
+
+class AnonymousCacheMixin:
+    """Serve list and retrieve for anonymous users from
+    anonymous_cache (AnonymousResponseCache), response has
+    X-Cache header with HIT or MISS.
+
+    get_cache_versions() - versions of other data in response."""
+    anonymous_cache = None
+
+    def get_cache_versions(self):
+        return ()
+
+    def _cached(self, handler, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+
+        key = self.anonymous_cache.get_key(
+            request, self.get_cache_versions())
+        data = self.anonymous_cache.get(key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            self.anonymous_cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(super().retrieve, request, *args, **kwargs)
+
+
+class CatalogViewSetMixin:
+    """Serve list and retrieve of reference models from catalog cache.
+
+    List requests with query parameters go through filter backends
+    over regular queryset.
+    Version stamp is catalog version, same for list and retrieve."""
+    def get_version_stamp(self):
+        model = self.queryset.model
+        return (f'{model._meta.label_lower}:{catalog.version(model)}',
+                catalog.last_modified(model))
+
+    def get_queryset(self):
+        if self.action == 'list' and not self.request.query_params:
+            return catalog.all(self.queryset.model)
+        return super().get_queryset()
+
+    def get_object(self):
+        obj = catalog.get(self.queryset.model, self.kwargs[self.lookup_field])
+        if obj is None:
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class TagViewSet(CatalogViewSetMixin,
+                 ConditionalGetMixin,
+                 SerializerTimingMixin,
+                 viewsets.GenericViewSet,
                  mixins.ListModelMixin,
                  mixins.RetrieveModelMixin):
     """ViewSet for Tag model.
@@ -27,21 +154,27 @@ class TagViewSet(viewsets.GenericViewSet,
     permission_classes = (permissions.AllowAny,)
 
 
-class IngredientViewSet(viewsets.GenericViewSet,
+class IngredientViewSet(CatalogViewSetMixin,
+                        ConditionalGetMixin,
+                        SerializerTimingMixin,
+                        viewsets.GenericViewSet,
                         mixins.RetrieveModelMixin,
                         mixins.ListModelMixin):
     """ViewSet for Ingredient model.
 
-    Only get method allowed."""
+    Only get method allowed.
+    '?name=' - bounded autocomplete, see IngredientSearchFilter."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (permissions.AllowAny,)
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('name',)
+    filter_backends = (IngredientSearchFilter,)
 
 
-class RecipeViewSet(viewsets.GenericViewSet,
+class RecipeViewSet(ConditionalGetMixin,
+                    AnonymousCacheMixin,
+                    SerializerTimingMixin,
+                    viewsets.GenericViewSet,
                     mixins.ListModelMixin,
                     mixins.RetrieveModelMixin,
                     mixins.CreateModelMixin,
@@ -51,19 +184,82 @@ class RecipeViewSet(viewsets.GenericViewSet,
 
     update and destroy - reassembled to protect Recipes from
         changes that can make other users.
+    get_queryset - list and retrieve prefetch author, tags and
+        ingredients, flags of request user are taken by serializers from
+        user relations (foodgram.relations).
     get_serializer_class - provide different serializer depending on method.
+    get_version_stamp - conditional GET of retrieve, stamp is made from
+        updated_at and counters of recipe, request user relations, author and
+        catalog versions of Tag and Ingredient. No Last-Modified: relations
+        and counters have no change time, only ETag is validated.
+    list and retrieve for anonymous users are cached,
+        see AnonymousCacheMixin.
     favorite() and shopping_cart() -
-        implements Favorite and ShoppingCart models.
-    download_shopping_cart() - download 'to buy list' depending on recipes
-        that user added to shopping_cart.
+        implements Favorite and ShoppingCart models, adding is one
+        INSERT ... ON CONFLICT DO NOTHING, removing is one DELETE,
+        so concurrent requests can't make duplicates.
+    favorite_batch() and shopping_cart_batch() - the same for list of
+        recipes ('/recipes/favorite/', {"ids": [1, 2]}), see
+        foodgram.batch.apply_batch.
+    download_shopping_cart() - download 'to buy list' of ingredient totals
+        of user shopping_cart (ShoppingCartIngredient, maintained
+        by shopping_cart() and recipe updates). File format is chosen by
+        '?format=' (txt, csv or pdf) or Accept header, txt if neither
+        matches. Rendered file is cached until shopping cart, recipes
+        or ingredients change.
+    by_ingredients() - recipes with given ingredients
+        ('?ingredients=1&ingredients=2') ranked by coverage,
+        '?missing=K' - skip recipes lacking more than K ingredients.
+        Combines with RecipeFilter parameters, paginated only by page
+        number, '?cursor=' is refused.
     """
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
-    pagination_class = CustomWithLimitPagination
+    pagination_class = RecipePagination
+    anonymous_cache = AnonymousResponseCache(
+        ignored_params=('is_favorited', 'is_in_shopping_cart'))
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        if self.action in ('list', 'retrieve', 'by_ingredients'):
+            queryset = queryset.select_related('author').prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.all()),
+                Prefetch('ingredient',
+                         queryset=IngredientToRecipe.objects.all()),
+            )
+
+        return queryset
+
+    def get_cache_versions(self):
+        return catalog.version(Tag), catalog.version(Ingredient)
+
+    def get_version_stamp(self):
+        if self.action != 'retrieve':
+            return None
+
+        row = Recipe.objects.filter(
+            pk=self.kwargs[self.lookup_field]
+        ).values_list(
+            'id', 'updated_at', 'favorites_count', 'author_id',
+            'author__username', 'author__first_name', 'author__last_name',
+            'author__email',
+        ).first()
+        if row is None:
+            return None
+
+        relations = get_user_relations(self.request)
+        stamp = hashlib.md5(repr((
+            row, row[0] in relations.favorites,
+            row[0] in relations.shopping_cart,
+            row[3] in relations.subscriptions,
+            catalog.version(Tag), catalog.version(Ingredient)
+        )).encode()).hexdigest()
+        return f'recipe:{self.kwargs[self.lookup_field]}:{stamp}', None
+
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
 
@@ -82,93 +278,180 @@ class RecipeViewSet(viewsets.GenericViewSet,
 
         return super().destroy(request, *args, **kwargs)
 
+    @atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+
     def get_serializer_class(self):
+        if self.action == 'by_ingredients':
+            return RecipeMatchSerializer
         return RecipeSerializer if self.request.method == 'GET' else (
             AddRecipeSerializer)
 
     @action(methods=['POST', 'DELETE'],
             detail=True,
             permission_classes=[permissions.IsAuthenticated])
+    @atomic
     def favorite(self, request, pk):
         recipe = get_object_or_404(Recipe, id=pk)
 
         if request.method == 'POST':
-            if Favorite.objects.filter(
-                    recipe=recipe, user=request.user).exists():
+            if not insert_or_ignore(Favorite, user_id=request.user.id,
+                                    recipe_id=recipe.id):
                 return Response(
                     {'detail': 'Recipe already in favorite.'},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            Favorite.objects.create(recipe=recipe, user=request.user)
-            serializer = ShortRecipeSerializer(recipe)
+            change_counter(Recipe, recipe.id, 'favorites_count', 1)
+            invalidate_user_relations(request)
+            serializer = timed_serializer(ShortRecipeSerializer)(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
-            if not Favorite.objects.filter(
-                    recipe=recipe, user=request.user).exists():
+            deleted, _ = Favorite.objects.filter(
+                recipe=recipe, user=request.user).delete()
+            if not deleted:
                 return Response(
                     {'detail': 'Recipe already not in favorite.'}
                 )
 
-            Favorite.objects.filter(recipe=recipe, user=request.user).delete()
+            change_counter(Recipe, recipe.id, 'favorites_count', -deleted)
+            invalidate_user_relations(request)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(methods=['POST', 'DELETE'],
             detail=True,
             permission_classes=[permissions.IsAuthenticated])
+    @atomic
     def shopping_cart(self, request, pk):
-        if not Recipe.objects.filter(id=pk).exists():
+        recipe = Recipe.objects.filter(id=pk).first()
+        if recipe is None:
             return Response(
                 {'detail': f'No such recipe with id {pk}.'},
                 status=status.HTTP_400_BAD_REQUEST)
-        recipe = Recipe.objects.get(id=pk)
-
-        shopping_cart, _ = ShoppingCart.objects.get_or_create(
-            user=request.user)
 
         if request.method == 'POST':
 
-            if recipe in shopping_cart.recipes.all():
+            if not insert_or_ignore(ShoppingCart, user_id=request.user.id,
+                                    recipe_id=recipe.id):
                 return Response(
                     {'detail':
                         f'Recipe with id {pk} already in shopping cart.'},
                     status=status.HTTP_400_BAD_REQUEST)
 
-            shopping_cart.recipes.add(recipe)
-            shopping_cart.save()
+            change_counter(Recipe, recipe.id, 'shopping_carts_count', 1)
+            change_cart_totals(request.user.id, [recipe.id], 1)
+            bump_shopping_cart_version(request.user.id)
+            invalidate_user_relations(request)
 
-            serializer = ShortRecipeSerializer(recipe)
+            serializer = timed_serializer(ShortRecipeSerializer)(recipe)
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
 
-            if recipe not in shopping_cart.recipes.all():
+            deleted, _ = ShoppingCart.objects.filter(
+                user=request.user, recipe=recipe).delete()
+            if not deleted:
                 return Response(
                     {'detail':
                         f'Recipe with id {pk} not in shopping cart.'},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            shopping_cart.recipes.remove(recipe)
+            change_counter(Recipe, recipe.id, 'shopping_carts_count',
+                           -deleted)
+            change_cart_totals(request.user.id, [recipe.id], -1)
+            bump_shopping_cart_version(request.user.id)
+            invalidate_user_relations(request)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(methods=['POST', 'DELETE'],
+            detail=False,
+            url_path='favorite',
+            url_name='favorite-batch',
+            permission_classes=[permissions.IsAuthenticated])
+    def favorite_batch(self, request):
+        return apply_batch(request, Favorite, 'recipe', 'favorites_count')
+
+    @action(methods=['POST', 'DELETE'],
+            detail=False,
+            url_path='shopping_cart',
+            url_name='shopping-cart-batch',
+            permission_classes=[permissions.IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        user_id = request.user.id
+
+        def update_cart(recipe_ids, sign):
+            change_cart_totals(user_id, sorted(recipe_ids), sign)
+            bump_shopping_cart_version(user_id)
+
+        return apply_batch(request, ShoppingCart, 'recipe',
+                           'shopping_carts_count', update_cart)
+
+    @action(detail=False, methods=['get'])
+    def by_ingredients(self, request):
+        try:
+            ingredient_ids = {
+                int(pk) for pk in request.query_params.getlist('ingredients')}
+            missing = request.query_params.get('missing')
+            missing = None if missing is None else int(missing)
+        except ValueError:
+            return Response(
+                {'detail': 'ingredients and missing should be integers.'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        if not ingredient_ids:
+            return Response({'ingredients': 'field is required.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if self.paginator.cursor_query_param in request.query_params:
+            return Response(
+                {'cursor': 'recipes ranked by coverage have no cursor.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        if missing is not None and missing < 0:
+            return Response({'missing': 'should be not less than 0.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = match_ingredients(
+            self.filter_queryset(self.get_queryset()),
+            list(catalog.in_bulk(Ingredient, ingredient_ids)),
+            missing,
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=False, methods=['get'],
-            permission_classes=(permissions.IsAuthenticated,))
+            permission_classes=(permissions.IsAuthenticated,),
+            renderer_classes=SHOPPING_CART_RENDERERS,
+            content_negotiation_class=ShoppingCartContentNegotiation)
     def download_shopping_cart(self, request):
-        ingredients = (
-            IngredientToRecipe.objects
-            .filter(recipe__shopping_carts__user=request.user)
-            .values('ingredient')
-            .annotate(total_amount=Sum('amount'))
-            .values_list('ingredient__name', 'total_amount',
-                         'ingredient__measurement_unit')
+        renderer = request.accepted_renderer
+        key = get_shopping_cart_file_key(request.user.id, renderer.format)
+        content = get_shopping_cart_file(key)
+
+        if content is not None:
+            chunks = [content]
+        else:
+            ingredients = (
+                ShoppingCartIngredient.objects
+                .filter(user=request.user)
+                .values_list('ingredient__name', 'total_amount',
+                             'ingredient__measurement_unit')
+                .order_by('ingredient__name')
+            )
+            chunks = cached_stream(
+                key,
+                renderer.stream(ingredients.iterator()),
+                SHOPPING_CART_CACHE_TIMEOUT,
+            )
+
+        file = StreamingHttpResponse(
+            chunks,
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
         )
-        file_list = []
-        [file_list.append(
-            '{} - {} {}.'.format(*ingredient)) for ingredient in ingredients]
-        file = HttpResponse('Cписок покупок:\n' + '\n'.join(file_list),
-                            content_type='text/plain')
-        file['Content-Disposition'] = (f'attachment; filename={FILE_NAME}')
+        file['Content-Disposition'] = (
+            f'attachment; filename={FILE_NAME}.{renderer.format}')
         return file
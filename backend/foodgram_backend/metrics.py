@@ -0,0 +1,298 @@
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from foodgram_backend.settings import (DEBUG, METRICS_TOKEN, QUERY_BUDGETS,
+                                       QUERY_BUDGETS_RAISE,
+                                       QUERY_COUNT_BUCKETS, TIME_BUCKETS)
+
+logger = logging.getLogger(__name__)
+
+# Not counted in queries: they depend on nesting of atomic blocks
+# (test cases wrap requests in a transaction) and on database backend.
+TRANSACTION_STATEMENTS = ('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT',
+                          'ROLLBACK TO SAVEPOINT')
+_request_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class Histogram:
+    """Cumulative histogram in Prometheus sense for every label value."""
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, label, value):
+        with self._lock:
+            counts, total = self._series.get(
+                label, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._series[label] = (counts, total + value)
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = sorted(
+                (label, list(counts), total)
+                for label, (counts, total) in self._series.items())
+
+        for label, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield (f'{self.name}_bucket{{endpoint="{label}",'
+                       f'le="{bound}"}} {cumulative}')
+            yield f'{self.name}_sum{{endpoint="{label}"}} {total}'
+            yield f'{self.name}_count{{endpoint="{label}"}} {cumulative}'
+
+
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds', 'Wall time of request.',
+    TIME_BUCKETS)
+SQL_DURATION = Histogram(
+    'foodgram_sql_duration_seconds', 'Time of SQL queries of request.',
+    TIME_BUCKETS)
+SERIALIZER_DURATION = Histogram(
+    'foodgram_serializer_duration_seconds',
+    'Time of top level serializers data of request.', TIME_BUCKETS)
+SQL_QUERIES = Histogram(
+    'foodgram_sql_queries', 'SQL queries of request.', QUERY_COUNT_BUCKETS)
+
+HISTOGRAMS = (REQUEST_DURATION, SQL_DURATION, SERIALIZER_DURATION,
+              SQL_QUERIES)
+
+_counters = []
+
+
+def register_counter(name, help_text, getter):
+    """Add counter to '/api/_metrics', getter returns its current value."""
+    _counters.append((name, help_text, getter))
+
+
+class RequestMetrics:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.wall_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            if not sql.startswith(TRANSACTION_STATEMENTS):
+                self.queries += 1
+
+    def as_dict(self):
+        return {
+            'endpoint': self.endpoint,
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'serializer_ms': round(self.serializer_time * 1000, 2),
+            'total_ms': round(self.wall_time * 1000, 2),
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def timed_serializer(serializer_class):
+    """Subclass of serializer_class adding time of its data to metrics
+    of current request. Only top level serializer is timed, nested ones
+    are part of it."""
+    class TimedSerializer(serializer_class):
+        @property
+        def data(self):
+            start = time.perf_counter()
+            try:
+                return super().data
+            finally:
+                metrics = _request_metrics.get()
+                if metrics is not None:
+                    metrics.serializer_time += time.perf_counter() - start
+
+        @classmethod
+        def many_init(cls, *args, **kwargs):
+            serializer = super().many_init(*args, **kwargs)
+            serializer.__class__ = timed_serializer(type(serializer))
+            return serializer
+
+    TimedSerializer.__name__ = serializer_class.__name__
+    TimedSerializer.__qualname__ = serializer_class.__qualname__
+    return TimedSerializer
+
+
+class SerializerTimingMixin:
+    """Serializers of get_serializer() add time of their data
+    to request metrics, serializers made directly are not timed."""
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = timed_serializer(self.get_serializer_class())
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
+
+
+def get_endpoint(request):
+    """'<view>.<action>' of resolved view, DRF viewset action
+    or HTTP method for other views."""
+    match = request.resolver_match
+    if match is None:
+        return 'unresolved'
+
+    view = getattr(match.func, 'cls', None) or getattr(
+        match.func, 'view_class', match.func)
+    method = request.method.lower()
+    action = getattr(match.func, 'actions', {}).get(method, method)
+    return f'{view.__name__}.{action}'
+
+
+def check_query_budget(metrics, budget=None):
+    """Raise QueryBudgetExceeded if request made more SQL queries than
+    budget, by default QUERY_BUDGETS of its endpoint."""
+    if budget is None:
+        budget = QUERY_BUDGETS.get(metrics.endpoint)
+    if budget is not None and metrics.queries > budget:
+        raise QueryBudgetExceeded(
+            f'{metrics.endpoint}: {metrics.queries} SQL queries, '
+            f'budget is {budget}.')
+
+
+def assert_query_budget(response, budget=None):
+    """Test helper for responses of django test client."""
+    check_query_budget(response.metrics, budget)
+
+
+class MetricsMiddleware:
+    """Measure SQL queries, SQL time, serializer time and wall time
+    of every request per endpoint (see get_endpoint()).
+
+    Values are sent in Server-Timing header, logged as JSON line,
+    kept on response.metrics and collected into in-process histograms
+    served by metrics_view. Serializer time covers views with
+    SerializerTimingMixin. Exceeded QUERY_BUDGETS are logged as warnings,
+    or raised when QUERY_BUDGETS_RAISE is set.
+
+    Streaming responses are measured until their content is consumed,
+    so the log line, histograms and budget check include queries made
+    while streaming. Server-Timing header is sent before the content
+    and covers only the view."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics('unresolved')
+        start = time.perf_counter()
+        with self._measure(metrics):
+            response = self.get_response(request)
+        metrics.wall_time = time.perf_counter() - start
+        metrics.endpoint = get_endpoint(request)
+
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={metrics.sql_time * 1000:.2f};'
+            f'desc="{metrics.queries} queries"',
+            f'serializer;dur={metrics.serializer_time * 1000:.2f}',
+            f'total;dur={metrics.wall_time * 1000:.2f}',
+        ))
+        response.metrics = metrics
+        if response.streaming:
+            response.streaming_content = self._measure_stream(
+                request, response, response.streaming_content, metrics,
+                start)
+        else:
+            self._report(request, response, metrics)
+        return response
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _measure(metrics):
+        token = _request_metrics.set(metrics)
+        try:
+            with _execute_wrappers(metrics):
+                yield
+        finally:
+            _request_metrics.reset(token)
+
+    def _measure_stream(self, request, response, content, metrics, start):
+        content = iter(content)
+        try:
+            while True:
+                with self._measure(metrics):
+                    chunk = next(content, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            metrics.wall_time = time.perf_counter() - start
+            self._report(request, response, metrics)
+
+    def _report(self, request, response, metrics):
+        REQUEST_DURATION.observe(metrics.endpoint, metrics.wall_time)
+        SQL_DURATION.observe(metrics.endpoint, metrics.sql_time)
+        SERIALIZER_DURATION.observe(
+            metrics.endpoint, metrics.serializer_time)
+        SQL_QUERIES.observe(metrics.endpoint, metrics.queries)
+        logger.info(json.dumps({
+            'method': request.method, 'path': request.path,
+            'status': response.status_code, **metrics.as_dict()}))
+
+        try:
+            check_query_budget(metrics)
+        except QueryBudgetExceeded as error:
+            if QUERY_BUDGETS_RAISE:
+                raise
+            logger.warning(str(error))
+
+
+class _execute_wrappers:
+    """execute_wrapper() for every configured database."""
+    def __init__(self, wrapper):
+        self.wrapper = wrapper
+        self._contexts = []
+
+    def __enter__(self):
+        for connection in connections.all():
+            context = connection.execute_wrapper(self.wrapper)
+            context.__enter__()
+            self._contexts.append(context)
+
+    def __exit__(self, *exc_info):
+        while self._contexts:
+            self._contexts.pop().__exit__(*exc_info)
+
+
+def metrics_view(request):
+    """Histograms and counters of this process in Prometheus text format.
+    Requires 'Authorization: Bearer <METRICS_TOKEN>', without token
+    is open only in DEBUG."""
+    if not METRICS_TOKEN:
+        if not DEBUG:
+            return HttpResponseForbidden()
+    elif request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return HttpResponseForbidden()
+
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.lines())
+    for name, help_text, getter in _counters:
+        lines.extend((f'# HELP {name} {help_text}',
+                      f'# TYPE {name} counter',
+                      f'{name} {getter()}'))
+
+    return HttpResponse('\n'.join(lines) + '\n',
+                        content_type='text/plain; version=0.0.4')
@@ -52,6 +52,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram_backend.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -97,6 +98,73 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Cache versions are shared by all gunicorn workers, so production needs
+# shared backend (Redis of docker-compose.yml, see env.example),
+# 'check --deploy' fails on process local one. LocMemCache is default
+# for development and tests.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Cache alias for Tag/Ingredient catalog versions and data.
+CATALOG_CACHE_ALIAS = os.getenv('CATALOG_CACHE_ALIAS', 'default')
+
+# How often (seconds) worker checks catalog version in shared cache.
+CATALOG_VERSION_CHECK_INTERVAL = 1
+
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Cache alias for anonymous recipe list and detail responses. Entries are
+# dropped on recipe create, update and delete, counters (favorites_count)
+# in cached responses may be stale up to RECIPES_CACHE_TIMEOUT seconds.
+RECIPES_CACHE_ALIAS = os.getenv('RECIPES_CACHE_ALIAS', 'default')
+RECIPES_CACHE_TIMEOUT = 60
+
+
+# Request metrics, see foodgram_backend.metrics.
+# '/api/_metrics' requires 'Authorization: Bearer <METRICS_TOKEN>',
+# without token it is open only in DEBUG.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+# Max SQL queries per '<view>.<action>' (token authentication included),
+# measured on PostgreSQL with cold catalog, user relations and recipe
+# caches. Exceeding is logged, or raised with QUERY_BUDGETS_RAISE,
+# and fails assert_query_budget() in tests.
+QUERY_BUDGETS_RAISE = False
+QUERY_BUDGETS = {
+    'TagViewSet.list': 2,
+    'TagViewSet.retrieve': 2,
+    'IngredientViewSet.list': 4,
+    'IngredientViewSet.retrieve': 2,
+    'RecipeViewSet.list': 9,
+    'RecipeViewSet.retrieve': 10,
+    'RecipeViewSet.by_ingredients': 9,
+    'RecipeViewSet.create': 16,
+    'RecipeViewSet.partial_update': 20,
+    'RecipeViewSet.update': 23,
+    'RecipeViewSet.favorite': 4,
+    'RecipeViewSet.shopping_cart': 6,
+    'RecipeViewSet.favorite_batch': 4,
+    'RecipeViewSet.shopping_cart_batch': 6,
+    'RecipeViewSet.download_shopping_cart': 2,
+    'SubscriptionsViewSet.list': 4,
+    'subscribe.post': 5,
+    'subscribe.delete': 4,
+    'subscribe_batch.post': 4,
+    'subscribe_batch.delete': 4,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -174,7 +242,52 @@ DJOSER = {
     }
 }
 
-FILE_NAME = 'shopping_cart.txt'
+# Max amount of ingredients returned by '?name=' autocomplete.
+INGREDIENTS_SEARCH_LIMIT = 20
+
+# PostgreSQL text search configuration for recipe '?search='.
+RECIPE_SEARCH_CONFIG = 'russian'
+
+# Without PostgreSQL '?search=' returns only this many best ranked
+# recipes, each of them is a parameter of the query.
+RECIPE_SEARCH_FALLBACK_LIMIT = 500
+
+# Trending recipes: score half-life in seconds, scores below
+# TRENDING_MIN_SCORE are dropped. Scores are updated by
+# 'update_trending --interval 300' (foodgram_trending service) or cron.
+TRENDING_HALF_LIFE = 60 * 60 * 24 * 3
+TRENDING_MIN_SCORE = 0.01
+
+# Extension depends on requested format.
+FILE_NAME = 'shopping_cart'
+
+# Rendered shopping cart files are kept in cache for this many seconds.
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+
+# Favorite, shopping cart and subscription id sets of user are kept
+# in cache for this many seconds, see foodgram.relations.
+USER_RELATIONS_CACHE_TIMEOUT = 60 * 5
+
+# Recipe images: allowed formats, max side in pixels, size in bytes
+# after which decoded upload is moved from memory to temporary file.
+RECIPE_IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+RECIPE_IMAGE_MAX_SIDE = 8000
+RECIPE_IMAGE_SPOOL_SIZE = 1024 * 1024
+
+# Thumbnail widths and amount of background threads making them.
+RECIPE_IMAGE_WIDTHS = (320, 640, 1280)
+RECIPE_IMAGE_WORKERS = 2
+
+# TrueType font with cyrillic glyphs for PDF shopping cart.
+PDF_FONT_PATH = os.getenv(
+    'PDF_FONT_PATH', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+# Upper bound for 'recipes_limit' on subscription endpoints.
+RECIPES_LIMIT_MAX = 10
+
+# Max ids in one request to batch favorite, shopping cart
+# and subscribe endpoints.
+BATCH_IDS_MAX = 100
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'collected_static'
@@ -16,9 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from foodgram_backend.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/_metrics', metrics_view, name='metrics'),
     path('api/', include('users.urls')),
     path('api/', include('foodgram.urls')),
 ]
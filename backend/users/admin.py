@@ -6,6 +6,7 @@ class UserAdmin(admin.ModelAdmin):
     """Admin model for Users."""
     search_fields = ['username', 'email']
     list_filter = ['username', 'email']
+    readonly_fields = ['recipes_count', 'subscribers_count']
 
 
 admin.site.register(User, UserAdmin)
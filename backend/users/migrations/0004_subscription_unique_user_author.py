@@ -0,0 +1,40 @@
+# Generated by Django 4.2.4 on 2026-10-18 06:29
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+from django.db.models.functions import Greatest
+
+
+def delete_duplicates(apps, schema_editor):
+    """Keep the first Subscription of every user/author pair,
+    decrease subscribers_count of author by deleted rows."""
+    Subscription = apps.get_model('users', 'Subscription')
+    User = apps.get_model('users', 'User')
+
+    duplicates = (
+        Subscription.objects.values('user', 'author')
+        .annotate(first_id=Min('id'), amount=Count('id'))
+        .filter(amount__gt=1)
+        .order_by()
+    )
+    for row in duplicates.iterator():
+        deleted, _ = Subscription.objects.filter(
+            user=row['user'], author=row['author'],
+        ).exclude(id=row['first_id']).delete()
+        User.objects.filter(id=row['author']).update(
+            subscribers_count=Greatest(F('subscribers_count') - deleted, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_recipes_count_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='Unique user/author subscription constraint.'),
+        ),
+    ]
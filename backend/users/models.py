@@ -6,10 +6,14 @@ from django.utils.translation import gettext_lazy as _
 class User(AbstractUser):
     """Inherit from AbstractUser and make first_name, last_name and email
      required.
+    recipes_count and subscribers_count - denormalized counters,
+     see foodgram.counters and 'recount' command.
     """
     first_name = models.CharField(_("first name"), max_length=150)
     last_name = models.CharField(_("last name"), max_length=150)
     email = models.EmailField(_("email address"), unique=True)
+    recipes_count = models.PositiveIntegerField(default=0)
+    subscribers_count = models.PositiveIntegerField(default=0)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["first_name", "last_name", "username"]
@@ -37,3 +41,9 @@ class Subscription(models.Model):
 
     class Meta:
         ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='Unique user/author subscription constraint.',
+            )
+        ]
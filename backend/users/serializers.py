@@ -2,13 +2,14 @@ from djoser.serializers import UserSerializer, UserCreateSerializer
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from users.models import Subscription
+from foodgram.relations import get_user_relations
 from foodgram_backend.settings import FORBIDDEN_USERNAMES
 
 
 class CustomReadUserSerializer(UserSerializer):
     """Serialize user model adding additional field 'is_subscribed'
-    that true if user subscribed on serialized user.
+    that true if user subscribed on serialized user, taken from
+    annotation or user relations of request user.
     Also, added extra validation for 'users/me/' endpoint.
     """
     is_subscribed = serializers.SerializerMethodField()
@@ -19,9 +20,10 @@ class CustomReadUserSerializer(UserSerializer):
         read_only_fields = UserSerializer.Meta.read_only_fields
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return False if user.is_anonymous else (
-            Subscription.objects.filter(user=user, author=obj).exists())
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.id in get_user_relations(
+            self.context['request']).subscriptions
 
     def validate(self, attrs):
         if ('me' in self.context['request'].path
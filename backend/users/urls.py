@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework import routers
-from users.views import subscribe, SubscriptionsViewSet
+from users.views import subscribe, subscribe_batch, SubscriptionsViewSet
 
 router_v1 = routers.DefaultRouter()
 router_v1.register(r'users/subscriptions', SubscriptionsViewSet,
@@ -8,6 +8,7 @@ router_v1.register(r'users/subscriptions', SubscriptionsViewSet,
 
 urlpatterns = [
     path('', include(router_v1.urls)),
+    path('users/subscribe/', subscribe_batch),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
     path('users/<int:pk>/subscribe/', subscribe),
@@ -1,41 +1,69 @@
+from django.db.models import F, Prefetch, Value, Window
+from django.db.transaction import atomic
+from django.db.models.functions import RowNumber
 from rest_framework import permissions, status, viewsets, mixins
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from users.models import Subscription, User
-from foodgram.serializers import SubscriptionSerializer
+from foodgram.batch import apply_batch
+from foodgram.counters import change_counter
+from foodgram.db import insert_or_ignore
+from foodgram.models import Recipe
+from foodgram.relations import invalidate_user_relations
+from foodgram.serializers import SubscriptionSerializer, get_recipes_limit
+from foodgram_backend.metrics import SerializerTimingMixin, timed_serializer
 
 
-class SubscriptionsViewSet(viewsets.GenericViewSet,
+class SubscriptionsViewSet(SerializerTimingMixin,
+                           viewsets.GenericViewSet,
                            mixins.ListModelMixin):
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = SubscriptionSerializer
     """ViewSet for Subscription model.
-    get_queryset() - returns users that request user subscribed on."""
+    get_queryset() - returns users that request user subscribed on
+        with prefetched 'recipes_limit' latest recipes of each author."""
     def get_queryset(self):
+        recipes_limit = get_recipes_limit(self.request.query_params)
+        recipes = Recipe.objects.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )
+        ).filter(row_number__lte=recipes_limit).order_by('-pub_date', '-id')
+
         return User.objects.filter(
             id__in=Subscription.objects.filter(
                 user=self.request.user).values_list('author__id', flat=True)
-        ).all()
+        ).annotate(
+            is_subscribed=Value(True),
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='recipes_preview')
+        )
 
 
 @api_view(['POST', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated])
+@atomic
 def subscribe(request, pk):
-    """Implement subscribe functionality."""
+    """Implement subscribe functionality.
+    Subscription is added with one INSERT ... ON CONFLICT DO NOTHING."""
     author = get_object_or_404(User, id=pk)
 
     if request.method == 'POST':
-        if (Subscription.objects.filter(user=request.user,
-                                        author=author).exists()
-                or request.user == author):
+        if request.user == author or not insert_or_ignore(
+                Subscription, user_id=request.user.id, author_id=author.id):
             return Response({
                 'detail': 'Already subscribed or trying to subscribe yourself.'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        Subscription.objects.create(user=request.user, author=author)
+        change_counter(User, author.id, 'subscribers_count', 1)
+        invalidate_user_relations(request)
+        author.is_subscribed = True
         context = dict(request=request)
-        serializer = SubscriptionSerializer(author, context=context)
+        serializer = timed_serializer(SubscriptionSerializer)(
+            author, context=context)
         return Response(
             serializer.data,
             status=status.HTTP_201_CREATED
@@ -44,8 +72,10 @@ def subscribe(request, pk):
     if request.method == 'DELETE':
         subscription = Subscription.objects.filter(user=request.user,
                                                    author=author)
-        if subscription.exists():
-            subscription.delete()
+        deleted, _ = subscription.delete()
+        if deleted:
+            change_counter(User, author.id, 'subscribers_count', -deleted)
+            invalidate_user_relations(request)
             return Response(
                 status=status.HTTP_204_NO_CONTENT
             )
@@ -54,3 +84,12 @@ def subscribe(request, pk):
             {'detail': 'You already unsubscribed this author.'},
             status=status.HTTP_400_BAD_REQUEST
         )
+
+
+@api_view(['POST', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def subscribe_batch(request):
+    """subscribe for list of authors: {"ids": [1, 2]},
+    returns status of every author, see foodgram.batch.apply_batch."""
+    return apply_batch(request, Subscription, 'author', 'subscribers_count',
+                       forbidden={request.user.id})